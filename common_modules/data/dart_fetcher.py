@@ -4,6 +4,13 @@ import pandas as pd
 import OpenDartReader
 
 class DartFetcher:
+    # Read-only lookups that can be memoized for a run (see run_cache.CachedFetcher)
+    CACHEABLE = ("get_financial_summary", "get_major_shareholders", "find_corp_code", "get_operating_income_history",
+                 "get_corp_listing", "get_largest_shareholders", "get_investments")
+
+    # Operating income account names (Korean / IFRS English)
+    OPERATING_INCOME = '영업이익|Operating Income'
+
     def __init__(self, api_key):
         self.api_key = api_key
         self.mock_data = None
@@ -73,6 +80,24 @@ class DartFetcher:
         
         return pd.DataFrame(rows)
 
+    def get_operating_income_history(self, corp_code, years):
+        """
+        Operating income per year: {year: amount, or None if unavailable}. years: tuple of years.
+        Annual statements also carry the two prior years (frmtrm / bfefrmtrm columns), so five
+        years usually take two requests.
+        """
+        history = {}
+        for year in sorted(years, reverse=True):
+            if year in history:
+                continue
+            fs = self.get_financial_summary(corp_code, year)
+            history[year] = account_amount(fs, self.OPERATING_INCOME)
+            for offset, column in ((1, "frmtrm_amount"), (2, "bfefrmtrm_amount")):
+                amount = account_amount(fs, self.OPERATING_INCOME, column)
+                if year - offset in years and year - offset not in history and amount is not None:
+                    history[year - offset] = amount
+        return {year: history[year] for year in sorted(years)}
+
     def get_major_shareholders(self, corp_code):
         if self.api_key == "MOCK":
             return self._get_mock_shareholders(corp_code)
@@ -90,6 +115,57 @@ class DartFetcher:
         data = self.mock_data[corp_code].get("shareholders", [])
         return pd.DataFrame(data)
 
+    def get_corp_listing(self):
+        """Listed companies known to DART: DataFrame with corp_code, corp_name, stock_code."""
+        if self.api_key == "MOCK":
+            # Mock corp codes double as tickers
+            return pd.DataFrame([{"corp_code": code, "corp_name": info["corp_name"], "stock_code": code}
+                                 for code, info in self.mock_data.items()],
+                                columns=["corp_code", "corp_name", "stock_code"])
+
+        try:
+            codes = self.dart.corp_codes
+            codes = codes[codes['stock_code'].str.strip() != '']
+            return codes[["corp_code", "corp_name", "stock_code"]].reset_index(drop=True)
+        except Exception as e:
+            print(f"Error fetching corp codes: {e}")
+            return None
+
+    def get_largest_shareholders(self, corp_code, year):
+        """Largest shareholder and related parties from the annual report (nm, trmend_posesn_stock_qota_rt)."""
+        if self.api_key == "MOCK":
+            return self._get_mock_shareholders(corp_code)
+
+        try:
+            return self.dart.report(corp_code, '최대주주', year)
+        except Exception as e:
+            print(f"Error fetching largest shareholders: {e}")
+            return None
+
+    def get_investments(self, corp_code, year):
+        """Investments in other companies from the annual report (inv_prm, trmend_blce_qota_rt)."""
+        if self.api_key == "MOCK":
+            if corp_code not in self.mock_data:
+                return None
+            return pd.DataFrame(self.mock_data[corp_code].get("investments", []))
+
+        try:
+            return self.dart.report(corp_code, '타법인출자', year)
+        except Exception as e:
+            print(f"Error fetching investments: {e}")
+            return None
+
+    def get_disclosures(self, start, end):
+        """All disclosures filed between start and end ("YYYYMMDD"): corp_code, report_nm, rcept_dt, ..."""
+        if self.api_key == "MOCK":
+            return pd.DataFrame(columns=["corp_code", "corp_name", "report_nm", "rcept_dt"])
+
+        try:
+            return self.dart.list(start=start, end=end)
+        except Exception as e:
+            print(f"Error fetching disclosures: {e}")
+            return None
+
     def find_corp_code(self, corp_name):
         if self.api_key == "MOCK":
             for code, info in self.mock_data.items():
@@ -101,3 +177,16 @@ class DartFetcher:
             return self.dart.find_corp_code(corp_name)
         except:
             return None
+
+
+def account_amount(fs, pattern, column="thstrm_amount"):
+    """First amount of the account matching `pattern` in a DART statement, or None."""
+    if fs is None or fs.empty or column not in fs.columns:
+        return None
+    rows = fs[fs['account_nm'].str.contains(pattern, na=False)]
+    if rows.empty:
+        return None
+    try:
+        return float(str(rows.iloc[0][column]).replace(',', ''))
+    except ValueError:
+        return None
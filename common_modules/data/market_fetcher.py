@@ -6,6 +6,9 @@ from bs4 import BeautifulSoup
 import re
 
 class MarketDataFetcher:
+    # Read-only lookups that can be memoized for a run (see run_cache.CachedFetcher)
+    CACHEABLE = ("get_fundamental", "get_stock_name")
+
     def __init__(self, use_mock=False):
         self.use_mock = use_mock
         # Simple mock data for market metrics
@@ -59,6 +62,68 @@ class MarketDataFetcher:
             
 
 
+    def get_fundamental_frame(self, tickers, date=None):
+        """
+        Fundamentals (PER, PBR, EPS, BPS, DIV...) of many tickers as one DataFrame indexed by ticker,
+        with lowercase column names for use as a screening feature frame.
+        Real mode uses a single whole-market pykrx request; tickers missing from it
+        fall back to get_fundamental one by one.
+        """
+        df = pd.DataFrame()
+        if not self.use_mock:
+            for i in range(5):
+                target_date = date or (datetime.now() - timedelta(days=i)).strftime("%Y%m%d")
+                try:
+                    df = stock.get_market_fundamental(target_date, market="ALL")
+                    if df is not None and not df.empty:
+                        break
+                except Exception as e:
+                    print(f"Error fetching market-wide fundamentals for {target_date}: {e}")
+                if date:
+                    break
+            if df is None:
+                df = pd.DataFrame()
+
+        df = df.reindex([t for t in tickers if t in df.index])
+        missing = [t for t in tickers if t not in df.index]
+        if missing:
+            if not self.use_mock:
+                print(f"Fetching fundamentals of {len(missing)} tickers one by one...")
+            rows = {}
+            for ticker in missing:
+                fund = self.get_fundamental(ticker, date)
+                if fund is not None:
+                    rows[ticker] = fund
+            if rows:
+                df = pd.concat([df, pd.DataFrame.from_dict(rows, orient="index")])
+
+        df = df.reindex(list(tickers))
+        df.columns = [str(c).lower() for c in df.columns]
+        return df
+
+    def get_market_caps(self, tickers, date=None):
+        """
+        Market capitalization of many tickers as a Series indexed by ticker (NaN if unknown).
+        Real mode uses a single whole-market pykrx request.
+        """
+        if self.use_mock:
+            return pd.Series({t: self.mock_market_data.get(t, {}).get("market_cap") for t in tickers},
+                             dtype=float).reindex(list(tickers))
+
+        caps = pd.Series(dtype=float)
+        for i in range(5):
+            target_date = date or (datetime.now() - timedelta(days=i)).strftime("%Y%m%d")
+            try:
+                df = stock.get_market_cap(target_date, market="ALL")
+                if df is not None and not df.empty:
+                    caps = df["시가총액"]
+                    break
+            except Exception as e:
+                print(f"Error fetching market caps for {target_date}: {e}")
+            if date:
+                break
+        return caps.reindex(list(tickers))
+
     def _fetch_fundamental_naver(self, ticker):
         """
         Fallback method to fetch fundamental data (PBR, PER, DIV) from Naver Finance
@@ -0,0 +1,216 @@
+import os
+import re
+import json
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+# Disclosures after which a company's stakes are re-read (incremental refresh)
+OWNERSHIP_DISCLOSURES = re.compile(r"사업보고서|반기보고서|분기보고서|최대주주|대량보유|타법인주식|합병|분할")
+
+
+def normalize_name(name):
+    """"(주)삼성물산", "삼성물산 주식회사" and "삼성물산" are the same company."""
+    name = re.sub(r"\(주\)|㈜|주식회사|\s+", "", str(name or ""))
+    return name.lower()
+
+
+class OwnershipGraph:
+    """
+    Ownership between listed companies, from DART annual reports of every listed company (largest
+    shareholders and investments in other companies) joined to the ticker master.
+    Stakes are kept per ticker on both sides - parents: {ticker: {owner ticker: %}}, children:
+    {ticker: {owned ticker: %}} - with the largest stake per side precomputed, so "is this company
+    owned by, or does it own, another listed company above X%" is a dict lookup.
+    Persisted as JSON at `path`; update() re-reads only the companies with new ownership disclosures.
+    """
+    # Stake (%) above which a listed parent or child counts (equity-method threshold)
+    DEFAULT_MIN_PCT = 20.0
+
+    # The disclosure list can only be searched this far back without a corp code; older graphs are rebuilt
+    REFRESH_MAX_DAYS = 90
+
+    def __init__(self, path=None, max_workers=4):
+        self.path = path
+        self.max_workers = max_workers
+        # ticker -> {"corp_code", "name"} of the listed companies
+        self.listing = {}
+        # Stakes as reported - holders: {ticker: {owner ticker: %}} (its largest shareholders),
+        # investments: {ticker: {owned ticker: %}} (its investments in other companies)
+        self.holders = {}
+        self.investments = {}
+        self.refreshed = None
+        self.parents = {}
+        self.children = {}
+        if path:
+            self.load()
+        self._reindex()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.listing = data["listing"]
+            self.holders = data["holders"]
+            self.investments = data["investments"]
+            self.refreshed = data["refreshed"]
+        except Exception as e:
+            print(f"Failed to load ownership graph ({e}). Rebuilding.")
+            self.listing, self.holders, self.investments, self.refreshed = {}, {}, {}, None
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"refreshed": self.refreshed, "listing": self.listing, "holders": self.holders,
+                       "investments": self.investments}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def update(self, dart, tickers, today=None, build=True):
+        """
+        Brings the graph up to date for the ticker master `tickers`: a full build the first time (or
+        after REFRESH_MAX_DAYS), else only the companies that filed ownership disclosures since the
+        last update, plus newly listed ones. Returns the number of companies (re-)read.
+        build=False never runs a full build (2-4 DART requests per listed company): a missing or
+        stale graph is left as it is (see is_current()).
+        """
+        today = today or datetime.now()
+        stale = not self.is_current(today)
+        if stale and not build:
+            print("Ownership graph missing or out of date, not rebuilt (full build not requested).")
+            return 0
+        disclosures = None
+        changed = set(tickers) - set(self.listing)
+        if changed or stale:
+            self._load_listing(dart, tickers)
+        if not self.listing:
+            print("Ownership graph: no DART corp listing, not built.")
+            return 0
+        if stale:
+            print(f"Building ownership graph for {len(self.listing)} listed companies...")
+            changed = set(self.listing)
+        else:
+            disclosures = dart.get_disclosures(self.refreshed, today.strftime("%Y%m%d"))
+            if disclosures is None:
+                # Unknown what changed: keep the refresh date, so the next update searches from it again
+                print(f"Warning: ownership disclosures since {self.refreshed} could not be fetched; "
+                      f"graph not refreshed (new listings only).")
+            elif not disclosures.empty:
+                filed = disclosures[disclosures['report_nm'].str.contains(OWNERSHIP_DISCLOSURES, na=False)]
+                by_code = {info["corp_code"]: ticker for ticker, info in self.listing.items()}
+                changed |= {by_code[code] for code in filed['corp_code'] if code in by_code}
+            changed &= set(self.listing)
+
+        year = today.year - 1
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for ticker, holders, investments in pool.map(lambda t: self._read(dart, t, year), sorted(changed)):
+                self.holders[ticker] = holders
+                self.investments[ticker] = investments
+        if stale or disclosures is not None:
+            self.refreshed = today.strftime("%Y%m%d")
+        self._reindex()
+        if changed:
+            print(f"Ownership graph: read {len(changed)} companies, {self.stats()}")
+        return len(changed)
+
+    def is_current(self, today=None):
+        """True if the graph was built and can still be refreshed incrementally (see REFRESH_MAX_DAYS)."""
+        if self.refreshed is None:
+            return False
+        today = today or datetime.now()
+        return today - datetime.strptime(self.refreshed, "%Y%m%d") <= timedelta(days=self.REFRESH_MAX_DAYS)
+
+    def parents_of(self, ticker, min_pct=None):
+        """{listed owner ticker: %} of `ticker` above min_pct."""
+        return self._above(self.parents.get(ticker, {}), min_pct)
+
+    def children_of(self, ticker, min_pct=None):
+        """{listed owned ticker: %} of `ticker` above min_pct."""
+        return self._above(self.children.get(ticker, {}), min_pct)
+
+    def has_listed_relation(self, ticker, min_pct=None):
+        """True if `ticker` is owned by, or owns, another listed company above min_pct (O(1))."""
+        min_pct = self.DEFAULT_MIN_PCT if min_pct is None else min_pct
+        return self._max_parent.get(ticker, 0.0) >= min_pct or self._max_child.get(ticker, 0.0) >= min_pct
+
+    def name(self, ticker):
+        return self.listing.get(ticker, {}).get("name", ticker)
+
+    def stats(self):
+        return {"companies": len(self.listing), "edges": sum(len(c) for c in self.children.values()),
+                "refreshed": self.refreshed}
+
+    def _above(self, stakes, min_pct):
+        min_pct = self.DEFAULT_MIN_PCT if min_pct is None else min_pct
+        return {ticker: pct for ticker, pct in stakes.items() if pct >= min_pct}
+
+    def _load_listing(self, dart, tickers):
+        # DART corp codes joined to the ticker master: only companies listed today are nodes
+        listing = dart.get_corp_listing()
+        if listing is None or listing.empty:
+            return
+        wanted = set(tickers)
+        self.listing = {row.stock_code: {"corp_code": row.corp_code, "name": row.corp_name}
+                        for row in listing.itertuples() if row.stock_code in wanted}
+        for stakes in (self.holders, self.investments):
+            for ticker in [t for t in stakes if t not in self.listing]:
+                del stakes[ticker]
+        self._reindex()
+
+    def _read(self, dart, ticker, year):
+        """(ticker, holders, investments) of one company from its latest annual report."""
+        corp_code = self.listing[ticker]["corp_code"]
+        # Until this year's annual report is filed, the previous one is the latest
+        for report_year in (year, year - 1):
+            holders = dart.get_largest_shareholders(corp_code, report_year)
+            investments = dart.get_investments(corp_code, report_year)
+            if (holders is not None and not holders.empty) or (investments is not None and not investments.empty):
+                break
+        return (ticker,
+                self._stakes(holders, ("nm", "stock_name"), ("trmend_posesn_stock_qota_rt", "stock_qota"), ticker),
+                self._stakes(investments, ("inv_prm",), ("trmend_blce_qota_rt",), ticker))
+
+    def _stakes(self, df, name_columns, pct_columns, own_ticker):
+        """{listed ticker: %} of the rows of a DART table whose name is a listed company other than own_ticker."""
+        if df is None or df.empty:
+            return {}
+        name_col = next((c for c in name_columns if c in df.columns), None)
+        pct_col = next((c for c in pct_columns if c in df.columns), None)
+        if name_col is None or pct_col is None:
+            return {}
+        stakes = {}
+        for name, pct in zip(df[name_col], df[pct_col]):
+            ticker = self._by_name.get(normalize_name(name))
+            pct = parse_percent(pct)
+            if ticker and ticker != own_ticker and pct is not None:
+                stakes[ticker] = max(pct, stakes.get(ticker, 0.0))
+        return stakes
+
+    def _reindex(self):
+        # Both sources report the same stake from either end; the larger figure wins
+        parents, children = {}, {}
+        for owned, holders in self.holders.items():
+            for owner, pct in holders.items():
+                parents.setdefault(owned, {})[owner] = max(pct, parents.get(owned, {}).get(owner, 0.0))
+        for owner, investments in self.investments.items():
+            for owned, pct in investments.items():
+                parents.setdefault(owned, {})[owner] = max(pct, parents.get(owned, {}).get(owner, 0.0))
+        for owned, owners in parents.items():
+            for owner, pct in owners.items():
+                children.setdefault(owner, {})[owned] = pct
+        self.parents, self.children = parents, children
+        self._max_parent = {t: max(s.values()) for t, s in parents.items()}
+        self._max_child = {t: max(s.values()) for t, s in children.items()}
+        self._by_name = {normalize_name(info["name"]): t for t, info in self.listing.items()}
+
+
+def parse_percent(value):
+    """"12.5", "1,234", "12.5%" -> float; None for "-", blanks and NaN."""
+    try:
+        pct = float(str(value).replace(",", "").replace("%", ""))
+    except ValueError:
+        return None
+    return pct if pct == pct else None
@@ -0,0 +1,87 @@
+import types
+import threading
+from concurrent.futures import Future
+
+
+class RunCache:
+    """
+    In-memory memo of fetcher calls for the lifetime of one job (run).
+    Identical calls (same fetcher, method and arguments) are only sent once;
+    concurrent callers of a call that is still in flight wait for its result.
+    """
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_call(self, key, func, *args, **kwargs):
+        with self._lock:
+            entry = self._entries.get(key)
+            is_owner = entry is None
+            if is_owner:
+                self.misses += 1
+                entry = Future()
+                self._entries[key] = entry
+            else:
+                self.hits += 1
+
+        if not is_owner:
+            return entry.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            # Do not memoize failures - the next caller retries
+            with self._lock:
+                self._entries.pop(key, None)
+            entry.set_exception(e)
+            raise
+        entry.set_result(result)
+        return result
+
+    def clear(self):
+        """Drops every entry and resets the hit/miss counters (e.g. when a run switches to mock data)."""
+        with self._lock:
+            self._entries = {}
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0
+        }
+
+
+class CachedFetcher:
+    """
+    Transparent proxy around a data fetcher (DartFetcher, MarketDataFetcher).
+    Methods listed in the fetcher's CACHEABLE attribute go through the RunCache,
+    everything else (attributes, other methods, assignments) reaches the fetcher as-is.
+    Cached methods run with the proxy as `self`, so the cacheable calls they make themselves
+    (e.g. get_operating_income_history -> get_financial_summary) share the cache too.
+    """
+    def __init__(self, fetcher, cache, methods=None):
+        object.__setattr__(self, "_fetcher", fetcher)
+        object.__setattr__(self, "_cache", cache)
+        object.__setattr__(self, "_methods", set(methods if methods is not None else getattr(fetcher, "CACHEABLE", ())))
+
+    def __getattr__(self, name):
+        attr = getattr(self._fetcher, name)
+        if name not in self._methods or not callable(attr):
+            return attr
+
+        prefix = (type(self._fetcher).__name__, name)
+        if getattr(attr, "__self__", None) is self._fetcher:
+            attr = types.MethodType(attr.__func__, self)
+
+        def cached(*args, **kwargs):
+            key = prefix + (args, tuple(sorted(kwargs.items())))
+            return self._cache.get_or_call(key, attr, *args, **kwargs)
+        return cached
+
+    def __setattr__(self, name, value):
+        setattr(self._fetcher, name, value)
@@ -0,0 +1,200 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from types import SimpleNamespace
+from google import genai
+from google.genai import types
+
+
+class GeminiBackend:
+    """Google Gemini API (google-genai SDK)."""
+    name = "gemini"
+
+    def __init__(self, api_key):
+        self.client = genai.Client(api_key=api_key)
+
+    def generate(self, model, prompt, config=None):
+        return self.client.models.generate_content(model=model, contents=prompt, config=config)
+
+    def submit_batch(self, model, path):
+        """Uploads a JSONL batch request file (see write_batch_file) and starts a batch job; returns its name."""
+        uploaded = self.client.files.upload(file=path, config=types.UploadFileConfig(
+            display_name=os.path.basename(path), mime_type="jsonl"))
+        job = self.client.batches.create(model=model, src=uploaded.name,
+                                         config=types.CreateBatchJobConfig(display_name=os.path.basename(path)))
+        return job.name
+
+    def batch_state(self, name):
+        """"running", "succeeded" or "failed" (failed also covers cancelled / expired jobs)."""
+        state = self.client.batches.get(name=name).state.name
+        if state in ("JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED"):
+            return "succeeded"
+        if state in ("JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"):
+            return "failed"
+        return "running"
+
+    def batch_results(self, name):
+        """Results of a finished batch job: [{"key", "text", "prompt_tokens", "output_tokens", "error"}]."""
+        job = self.client.batches.get(name=name)
+        content = self.client.files.download(file=job.dest.file_name).decode("utf-8")
+        results = []
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            response = item.get("response") or {}
+            usage = response.get("usageMetadata") or {}
+            parts = ((response.get("candidates") or [{}])[0].get("content") or {}).get("parts") or []
+            results.append({
+                "key": item.get("key"),
+                "text": "".join(part.get("text", "") for part in parts),
+                "prompt_tokens": usage.get("promptTokenCount"),
+                "output_tokens": usage.get("candidatesTokenCount"),
+                "error": item.get("error") and json.dumps(item["error"], ensure_ascii=False)
+            })
+        return results
+
+
+class FakeRateLimitError(Exception):
+    """429 of the fake backend, shaped like the API's (status and retryDelay hint in the message)."""
+    code = 429
+
+
+class FakeBackend:
+    """
+    In-process stand-in for the Gemini API, for offline runs, load tests and CI (LLM_BACKEND=fake).
+
+    - Latency: log-normal around `latency` seconds (LLM_FAKE_LATENCY), with a long tail like the real API.
+    - 429 bursts: each call starts a burst with probability `burst_rate` (LLM_FAKE_429_RATE); for
+      `burst_seconds` (LLM_FAKE_BURST_SECONDS) every call then fails with a RESOURCE_EXHAUSTED error
+      carrying a retryDelay hint.
+    - Responses: with a response_schema, a schema-valid JSON instance (integers within minimum/maximum;
+      for arrays of objects keyed by "ticker", one item per "Ticker: ..." in the prompt), otherwise
+      a short markdown report. Answers are deterministic per model, prompt and config["seed"]; "flash" models answer faster.
+    - Batch jobs: submit_batch() answers the request file locally; the job reports "running" for
+      `batch_seconds` (LLM_FAKE_BATCH_SECONDS) before it succeeds. No 429s.
+    """
+    name = "fake"
+
+    def __init__(self, latency=None, burst_rate=None, burst_seconds=None, seed=None, batch_seconds=None):
+        self.latency = float(latency if latency is not None else os.getenv("LLM_FAKE_LATENCY", "1.0"))
+        self.burst_rate = float(burst_rate if burst_rate is not None else os.getenv("LLM_FAKE_429_RATE", "0.02"))
+        self.burst_seconds = float(burst_seconds if burst_seconds is not None else os.getenv("LLM_FAKE_BURST_SECONDS", "5"))
+        self.batch_seconds = float(batch_seconds if batch_seconds is not None else os.getenv("LLM_FAKE_BATCH_SECONDS", "2"))
+        self.calls = 0
+        self.batches = {}
+        self.burst_until = 0.0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def submit_batch(self, model, path):
+        results = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                prompt = "".join(part["text"] for content in item["request"]["contents"] for part in content["parts"])
+                text = self._respond(model, prompt, item["request"].get("generation_config"))
+                results.append({"key": item["key"], "text": text, "prompt_tokens": len(prompt) // 4 + 1,
+                                "output_tokens": len(text) // 4 + 1, "error": None})
+        with self._lock:
+            name = f"batches/fake-{len(self.batches) + 1}"
+            self.batches[name] = (time.monotonic() + self.batch_seconds, results)
+        return name
+
+    def batch_state(self, name):
+        with self._lock:
+            done_at, _ = self.batches[name]
+        return "succeeded" if time.monotonic() >= done_at else "running"
+
+    def batch_results(self, name):
+        with self._lock:
+            return list(self.batches[name][1])
+
+    def generate(self, model, prompt, config=None):
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            if now >= self.burst_until and self._random.random() < self.burst_rate:
+                self.burst_until = now + self.burst_seconds
+            remaining = self.burst_until - now
+            delay = self._random.lognormvariate(0, 0.5) * self.latency if self.latency > 0 else 0.0
+            if "flash" in model:
+                # Small models answer several times faster
+                delay /= 4
+        if remaining > 0:
+            time.sleep(min(delay, 0.05))
+            raise FakeRateLimitError(
+                f"429 RESOURCE_EXHAUSTED. {{'error': {{'code': 429, 'status': 'RESOURCE_EXHAUSTED', "
+                f"'details': [{{'@type': 'type.googleapis.com/google.rpc.RetryInfo', 'retryDelay': '{remaining:.1f}s'}}]}}}}"
+            )
+        time.sleep(delay)
+
+        text = self._respond(model, prompt, config)
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(prompt_token_count=len(prompt) // 4 + 1, candidates_token_count=len(text) // 4 + 1)
+        )
+
+    def _respond(self, model, prompt, config):
+        # Same model, prompt and sampling seed, same answer (like a deterministic model)
+        seed = _config_value(config, "seed")
+        rng = random.Random(hashlib.sha256(f"{model}\n{seed}\n{prompt}".encode("utf-8")).hexdigest())
+        schema = _config_value(config, "response_schema")
+        if schema is not None:
+            return json.dumps(self._instance(schema, prompt, rng), ensure_ascii=False)
+        return (f"### Fake analysis ({model})\n"
+                f"- Summary: offline stand-in response for a {len(prompt)}-character prompt.\n"
+                f"- Verdict: {rng.choice(['Undervalued', 'Fairly valued', 'Value trap risk'])}\n")
+
+    def _instance(self, schema, prompt, rng, key=None):
+        kind = str(schema.get("type", "STRING")).upper()
+        if kind == "OBJECT":
+            item = {name: self._instance(prop, prompt, rng) for name, prop in schema.get("properties", {}).items()}
+            if key is not None and "ticker" in item:
+                item["ticker"] = key
+            return item
+        if kind == "ARRAY":
+            items = schema.get("items", {"type": "STRING"})
+            keys = re.findall(r"Ticker: (\w+)", prompt) if "ticker" in items.get("properties", {}) else []
+            return [self._instance(items, prompt, rng, key=k) for k in keys] or \
+                [self._instance(items, prompt, rng) for _ in range(rng.randint(1, 3))]
+        if kind == "INTEGER":
+            return rng.randint(int(schema.get("minimum", 0)), int(schema.get("maximum", 10)))
+        if kind == "NUMBER":
+            return round(rng.uniform(float(schema.get("minimum", 0)), float(schema.get("maximum", 1))), 2)
+        if kind == "BOOLEAN":
+            return rng.random() < 0.5
+        if schema.get("enum"):
+            return rng.choice(schema["enum"])
+        return "Offline stand-in reasoning."
+
+
+def _config_value(config, name):
+    if config is None:
+        return None
+    if isinstance(config, dict):
+        return config.get(name)
+    return getattr(config, name, None)
+
+
+def make_backend(name=None, api_key=None):
+    """
+    Backend by name, or LLM_BACKEND ("gemini" by default, "fake" for the offline stand-in).
+    Returns None for Gemini without an API key.
+    """
+    name = (name or os.getenv("LLM_BACKEND") or "gemini").lower()
+    if name == "fake":
+        print("Using the fake LLM backend (offline stand-in).")
+        return FakeBackend()
+    if name != "gemini":
+        raise ValueError(f"Unknown LLM backend: {name}")
+    if not api_key:
+        print("Warning: GEMINI_API_KEY not found in .env")
+        return None
+    return GeminiBackend(api_key)
@@ -1,83 +1,403 @@
 import os
+import copy
+import json
 import time
-from google import genai
+import hashlib
+import asyncio
+import threading
+from functools import partial
+from concurrent.futures import Future, ThreadPoolExecutor
 from dotenv import load_dotenv
+from .backends import make_backend
+from .metrics import LLMMetrics
+from .prompt_builder import PromptBuilder, format_number
+from .rate_limit import CircuitBreaker, CircuitOpenError, is_rate_limited, retry_after
+from ..rate_limit import TokenBucket
+from .response_cache import ResponseCache
+from .results import LLMError, LLMResult
+from .structured import extract_json, json_config
 
 # Load .env from project root (2 levels up from common_modules/llm/llm_client.py)
 env_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../.env"))
 load_dotenv(env_path)
 
 class LLMClient:
-    def __init__(self):
+    # Rate limiting is shared by every call (and every client) in the process: one request rate
+    # (LLM_RATE_PER_MINUTE) and one circuit breaker that fails fast while the provider is saturated.
+    _rate_limiter = TokenBucket(float(os.getenv("LLM_RATE_PER_MINUTE", "60")))
+    _breaker = CircuitBreaker(
+        failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+        cooldown=float(os.getenv("LLM_BREAKER_COOLDOWN", "60"))
+    )
+
+    # Identical requests in flight (same cache key) share one API call, across all clients
+    _inflight = {}
+    _inflight_lock = threading.Lock()
+
+    # Model per task ("default" for everything not listed); LLM_MODEL / LLM_TRIAGE_MODEL override them
+    DEFAULT_MODELS = {
+        "default": "gemini-3-pro-preview",
+        # Cheap, fast model for bulk first-pass scoring
+        "triage": "gemini-2.5-flash"
+    }
+
+    # 429 retries: server retry hint if there is one, else 15s doubling
+    MAX_RETRIES = 4
+    RETRY_DELAY = 15
+
+    def __init__(self, max_concurrency=None, cache_dir=None, cache_ttl=24 * 3600, cache_max_entries=2000, bypass_cache=None,
+                 backend=None):
+        # Max LLM requests in flight at once for this client
+        self.max_concurrency = max(1, int(max_concurrency or os.getenv("LLM_MAX_CONCURRENCY", "4")))
+        # API calls run on these workers; requests waiting for a retry or a rate-limit slot are
+        # re-scheduled with a timer instead of sleeping on a worker
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="llm")
+        
+        # Persistent response cache: identical (model, prompt, params) requests are answered from disk.
+        # bypass_cache (or LLM_CACHE_BYPASS=1) always calls the API, but still refreshes the cache.
+        if bypass_cache is None:
+            bypass_cache = os.getenv("LLM_CACHE_BYPASS") == "1"
+        self.bypass_cache = bypass_cache
+        cache_dir = cache_dir or os.getenv("LLM_CACHE_DIR") or os.path.abspath(
+            os.path.join(os.path.dirname(__file__), "../../.cache/llm"))
+        self.cache = ResponseCache(cache_dir, ttl_seconds=cache_ttl, max_entries=cache_max_entries)
+        # Request files and job records of batch-job mode (generate_batch)
+        self.batch_dir = os.getenv("LLM_BATCH_DIR") or os.path.join(os.path.dirname(os.path.abspath(cache_dir)), "llm_batches")
+        # Requests answered by joining an identical request already in flight
+        self.coalesced = 0
+        # Per-call latency / token / error records of this client
+        self.metrics = LLMMetrics()
+        
+        self.models = dict(self.DEFAULT_MODELS)
+        self.models["default"] = os.getenv("LLM_MODEL", self.models["default"])
+        self.models["triage"] = os.getenv("LLM_TRIAGE_MODEL", self.models["triage"])
+        self.model_id = self.models["default"]
         self.api_key = os.getenv("GEMINI_API_KEY")
-        if not self.api_key:
-            print("Warning: GEMINI_API_KEY not found in .env")
-            self.client = None
+        # Where requests go: Gemini (default), or e.g. the offline FakeBackend (LLM_BACKEND=fake).
+        # None when there is no API key.
+        self.backend = backend or make_backend(api_key=self.api_key)
+        # Underlying google-genai client of the Gemini backend
+        self.client = getattr(self.backend, "client", None)
+
+    def model_for(self, task=None):
+        """Model that serves `task` (e.g. "triage"); the default model for anything else."""
+        return self.models.get(task or "default", self.model_id)
+
+    def _submit(self, model, prompt, params=None):
+        """
+        Schedules an API call and returns a Future of its LLMResult (LLMError on failure).
+        Rate-limited calls are retried after the server's retry hint (or 15s doubling, 4 retries);
+        the retry is re-scheduled, so the worker moves on to other requests in the meantime.
+        While the circuit breaker is open the Future fails fast with a CircuitOpenError result.
+        """
+        future = Future()
+        self._dispatch(future, model, prompt, params, 0)
+        return future
+
+    def _dispatch(self, future, model, prompt, params, attempt, delay=0.0):
+        if delay > 0:
+            timer = threading.Timer(delay, self._dispatch, (future, model, prompt, params, attempt))
+            timer.daemon = True
+            timer.start()
         else:
-            self.client = genai.Client(api_key=self.api_key)
-            self.model_id = 'gemini-3-pro-preview'
+            self._executor.submit(self._attempt, future, model, prompt, params, attempt)
+
+    def _attempt(self, future, model, prompt, params, attempt):
+        # Rate slot first: a call re-scheduled by the limiter must not hold the half-open trial
+        wait = self._rate_limiter.reserve()
+        if wait > 0:
+            self._dispatch(future, model, prompt, params, attempt, delay=wait)
+            return
+        if not self._breaker.allow():
+            error = CircuitOpenError("LLM provider saturated (circuit breaker open)")
+            future.set_result(LLMError.from_exception(error, model_id=model, retries=attempt))
+            return
+        
+        try:
+            self._call(future, model, prompt, params, attempt)
+        except Exception as e:
+            # Anything else that fails (e.g. response.text raising on a blocked response) still ends
+            # the call: the Future must resolve and the breaker trial must be freed, or waiters hang
+            self._breaker.release()
+            if not future.done():
+                future.set_result(LLMError.from_exception(e, model_id=model, retries=attempt))
 
-    def _call_with_retry(self, func, *args, **kwargs):
+    def _call(self, future, model, prompt, params, attempt):
+        """The API call of one attempt allowed by the circuit breaker; resolves or re-schedules `future`."""
+        try:
+            response = self.backend.generate(model, prompt, params or None)
+        except Exception as e:
+            if is_rate_limited(e):
+                self._breaker.record_failure()
+                if attempt < self.MAX_RETRIES:
+                    hint = retry_after(e)
+                    if hint is not None:
+                        # The quota is shared: hold every request until the server's hint
+                        self._rate_limiter.pause(hint)
+                    delay = hint if hint is not None else self.RETRY_DELAY * 2 ** attempt
+                    print(f"LLM 429 Limit hit. Retrying in {delay:g}s ({attempt+1}/{self.MAX_RETRIES})...")
+                    self._dispatch(future, model, prompt, params, attempt + 1, delay=delay)
+                    return
+            else:
+                # Not a saturation signal: frees the trial slot without closing or re-opening
+                self._breaker.release()
+            future.set_result(LLMError.from_exception(e, model_id=model, retries=attempt))
+            return
+        
+        self._breaker.record_success()
+        if not response.text:
+            future.set_result(LLMError("EmptyResponse", "LLM returned no text", model_id=model, retries=attempt))
+            return
+        usage = getattr(response, "usage_metadata", None)
+        future.set_result(LLMResult(
+            response.text,
+            model_id=model,
+            prompt_tokens=getattr(usage, "prompt_token_count", None),
+            output_tokens=getattr(usage, "candidates_token_count", None),
+            cached_tokens=getattr(usage, "cached_content_token_count", None),
+            retries=attempt
+        ))
+
+    def _generate(self, prompt, params=None, bypass_cache=False, task=None, prefix=None):
         """
-        Retries the function call if it fails with a 429 error.
-        Max retries: 4. Initial delay: 15s.
+        Single path for every request: response cache lookup, then the rate-limited API call -
+        or, if an identical request is already in flight, its result.
+        params: generation config (e.g. response schema) - sent with the request and part of the cache key.
+        task: routes the request to model_for(task).
+        prefix: static text the prompt follows (sent first, inline).
+        Returns an LLMResult (LLMError on failure) and records it in self.metrics.
         """
-        max_retries = 4
-        delay = 15 
+        start = time.monotonic()
+        result = self._cached_or_shared(self.model_for(task), prompt, params, bypass_cache, prefix)
+        self.metrics.record(result, (prefix or "") + prompt, time.monotonic() - start, task=task)
+        return result
+
+    def _cached_or_shared(self, model, prompt, params, bypass_cache, prefix=None):
+        # Keyed by the full text (prefix + prompt)
+        key = ResponseCache.make_key(model, (prefix or "") + prompt, params)
+        if not (bypass_cache or self.bypass_cache):
+            cached = self.cache.get(key)
+            if cached is not None:
+                return LLMResult(cached, model_id=model, source="cache")
         
-        for attempt in range(max_retries + 1):
-            try:
-                return func(*args, **kwargs)
-            except Exception as e:
-                error_str = str(e)
-                if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str:
-                    if attempt < max_retries:
-                        print(f"LLM 429 Limit hit. Waiting {delay}s before retry ({attempt+1}/{max_retries})...")
-                        time.sleep(delay)
-                        delay *= 2 # Exponential backoff
-                        continue
-                raise e # Re-raise if not 429 or max retries exceeded
-
-    def analyze_company(self, company_data, prompt_template):
+        with LLMClient._inflight_lock:
+            future = LLMClient._inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self._submit(model, (prefix or "") + prompt, params)
+                LLMClient._inflight[key] = future
+            else:
+                self.coalesced += 1
+        if is_owner:
+            # Outside the lock: runs right away if the call already finished
+            future.add_done_callback(partial(self._settle, key, time.monotonic()))
+            return future.result()
+        
+        # Same response, but no API call (or token spend) of our own
+        result = copy.copy(future.result())
+        result.source = "coalesced"
+        result.retries = 0
+        return result
+
+    def _settle(self, key, start, future):
+        """Caches the response of a finished request, then stops sharing it."""
+        try:
+            result = future.result()
+            if result.ok:
+                self.cache.put(key, result.text, latency=time.monotonic() - start, model_id=result.model_id)
+        finally:
+            with LLMClient._inflight_lock:
+                LLMClient._inflight.pop(key, None)
+
+    def cache_stats(self):
+        return dict(self.cache.stats(), coalesced=self.coalesced)
+
+    def analyze_company(self, company_data, prompt_template, bypass_cache=False):
         """
         Sends company data to LLM for analysis using the provided prompt.
+        Returns an LLMResult (LLMError on failure).
         """
-        if not self.client:
-            return "Error: No API Key or Client not initialized"
+        if not self.backend:
+            return LLMError("NotInitialized", "No API Key or Client not initialized", model_id=self.model_id)
+
+        return self.generate_text(self.analysis_prompt(company_data, prompt_template), bypass_cache=bypass_cache)
 
-        prompt = prompt_template.format(
+    @staticmethod
+    def analysis_prompt(company_data, prompt_template):
+        """The prompt analyze_company sends for company_data (e.g. for budget estimates)."""
+        # Compact values; over the prompt token budget, the oldest profit years go first
+        return PromptBuilder(prompt_template, trim=("profit_history",)).build(
             name=company_data['name'],
             ticker=company_data['ticker'],
             pbr=company_data['pbr'],
             profit_history=company_data['profit_history'],
             cash_ratio=f"{company_data['cash_ratio']:.2%}",
-            shareholder_stake=f"{company_data['shareholder_stake']}%"
+            shareholder_stake=f"{format_number(company_data['shareholder_stake'])}%"
         )
-        
-        try:
-            # New SDK usage: client.models.generate_content
-            response = self._call_with_retry(
-                self.client.models.generate_content,
-                model=self.model_id,
-                contents=prompt
-            )
-            return response.text
-        except Exception as e:
-            return f"Error calling LLM: {e}"
 
-    def generate_text(self, prompt):
+    def generate_text(self, prompt, bypass_cache=False, params=None, task=None, prefix=None):
         """
         Generic method to send any text prompt to the LLM.
+        params: optional generation config, e.g. json_config(schema) for structured output.
+        task: optional routing key, e.g. "triage" for the cheap model (see model_for).
+        prefix: optional static text (instructions, rubric) the prompt follows; prepended to it.
+        Returns an LLMResult (str() is the text), or an LLMError on failure.
         """
-        if not self.client:
-            return "Error: Client not initialized"
+        if not self.backend:
+            return LLMError("NotInitialized", "Client not initialized", model_id=self.model_id)
             
         try:
-            response = self._call_with_retry(
-                self.client.models.generate_content,
-                model=self.model_id,
-                contents=prompt
-            )
-            return response.text
+            return self._generate(prompt, params=params, bypass_cache=bypass_cache, task=task, prefix=prefix)
         except Exception as e:
-            return f"Error calling LLM: {e}"
+            return LLMError.from_exception(e, model_id=self.model_for(task))
+
+    def generate_json(self, prompt, response_schema=None, bypass_cache=False):
+        """
+        Structured output: asks for JSON (constrained by response_schema, see ScoreSchema.response_schema)
+        and parses it with the tolerant extractor.
+        Returns the parsed object; raises ValueError with the raw text if it cannot be parsed.
+        """
+        result = self.generate_text(prompt, bypass_cache=bypass_cache, params=json_config(response_schema))
+        if not result.ok:
+            raise ValueError(f"LLM call failed: {result}")
+        try:
+            return extract_json(result.text)
+        except ValueError as e:
+            raise ValueError(f"{e} - response: {result.text}")
+
+    def generate_many(self, prompts, max_concurrency=None, params=None, task=None, prefix=None):
+        """
+        Sends several prompts concurrently (at most max_concurrency at once, and never more than
+        the client's limit). Returns the LLMResults in input order; a failed item gets its
+        LLMError without affecting the others.
+        """
+        prompts = list(prompts)
+        if not prompts:
+            return []
+        workers = min(len(prompts), max_concurrency or self.max_concurrency)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(lambda prompt: self.generate_text(prompt, params=params, task=task, prefix=prefix), prompts))
+
+    def generate_batch(self, prompts, params=None, task=None, prefix=None, poll_seconds=None, timeout=None):
+        """
+        Batch-job mode for work that is not latency-critical (billed at batch prices): the prompts
+        the response cache cannot answer are written to one JSONL request file, submitted as a
+        batch job, polled every poll_seconds (LLM_BATCH_POLL_SECONDS) until it finishes, and the
+        results are mapped back by request key. The job is recorded next to its request file, so a
+        run that times out (timeout / LLM_BATCH_TIMEOUT) or is interrupted resumes polling it
+        instead of submitting again.
+        Returns the LLMResults in input order (LLMError for failed items), like generate_many.
+        """
+        prompts = list(prompts)
+        if not prompts:
+            return []
+        model = self.model_for(task)
+        if not self.backend:
+            return [LLMError("NotInitialized", "Client not initialized", model_id=model) for _ in prompts]
+        if not hasattr(self.backend, "submit_batch"):
+            print("LLM backend has no batch jobs, sending the requests directly.")
+            return self.generate_many(prompts, params=params, task=task, prefix=prefix)
+
+        start = time.monotonic()
+        # The prefix goes inline: a batch is a single submission, there is nothing to repeat
+        texts = [(prefix or "") + prompt for prompt in prompts]
+        keys = [ResponseCache.make_key(model, text, params) for text in texts]
+        results = {}
+        if not self.bypass_cache:
+            for key in set(keys):
+                cached = self.cache.get(key)
+                if cached is not None:
+                    results[key] = LLMResult(cached, model_id=model, source="cache")
+        requests = {key: text for key, text in zip(keys, texts) if key not in results}
+        if requests:
+            results.update(self._run_batch_job(model, requests, params, poll_seconds, timeout))
+
+        latency = time.monotonic() - start
+        for key, text in zip(keys, texts):
+            self.metrics.record(results[key], text, latency if results[key].source != "cache" else 0.0, task=task)
+        return [results[key] for key in keys]
+
+    def _run_batch_job(self, model, requests, params, poll_seconds=None, timeout=None):
+        """Submits (or resumes) the batch job for {key: prompt} and waits for it. Returns {key: LLMResult}."""
+        poll_seconds = poll_seconds or float(os.getenv("LLM_BATCH_POLL_SECONDS", "30"))
+        timeout = timeout or float(os.getenv("LLM_BATCH_TIMEOUT", str(24 * 3600)))
+        os.makedirs(self.batch_dir, exist_ok=True)
+        # Same requests, same file - which is how a re-run finds its job
+        batch_id = hashlib.sha256("\n".join(sorted(requests)).encode("utf-8")).hexdigest()[:16]
+        path = os.path.join(self.batch_dir, f"{batch_id}.jsonl")
+        job_path = os.path.join(self.batch_dir, f"{batch_id}.job.json")
+
+        def fail(error_class, message):
+            return {key: LLMError(error_class, message, model_id=model) for key in requests}
+
+        if os.path.exists(job_path):
+            with open(job_path, "r", encoding="utf-8") as f:
+                job = json.load(f)["job"]
+            print(f"Resuming LLM batch job {job} ({len(requests)} requests).")
+        else:
+            self.write_batch_file(path, requests, params)
+            try:
+                job = self.backend.submit_batch(model, path)
+            except Exception as e:
+                return fail(type(e).__name__, str(e))
+            with open(job_path, "w", encoding="utf-8") as f:
+                json.dump({"job": job, "model": model, "requests": len(requests), "submitted_at": time.time()}, f)
+            print(f"Submitted LLM batch job {job} ({len(requests)} requests, {path}).")
+
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                state = self.backend.batch_state(job)
+            except Exception as e:
+                return fail(type(e).__name__, str(e))
+            if state != "running":
+                break
+            if time.monotonic() >= deadline:
+                # The job record stays, so the next run picks the job up again
+                return fail("BatchTimeout", f"Batch job {job} still running after {timeout:.0f}s; re-run to resume it.")
+            time.sleep(poll_seconds)
+
+        os.remove(job_path)
+        if state == "failed":
+            return fail("BatchJobFailed", f"Batch job {job} failed.")
+        results = {}
+        for item in self.backend.batch_results(job):
+            key = item["key"]
+            if key not in requests:
+                continue
+            if item["error"] or not item["text"]:
+                results[key] = LLMError("BatchItemError", item["error"] or "Empty response", model_id=model)
+                continue
+            results[key] = LLMResult(item["text"], model_id=model, prompt_tokens=item["prompt_tokens"],
+                                     output_tokens=item["output_tokens"], source="batch")
+            self.cache.put(key, item["text"], model_id=model)
+        for key in requests:
+            results.setdefault(key, LLMError("BatchItemError", f"No result in batch job {job}", model_id=model))
+        return results
+
+    @staticmethod
+    def write_batch_file(path, requests, params=None):
+        """JSONL batch request file: one {"key", "request"} line per {key: prompt}, params as generation config."""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for key, prompt in requests.items():
+                request = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+                if params:
+                    request["generation_config"] = params
+                f.write(json.dumps({"key": key, "request": request}, ensure_ascii=False, default=str) + "\n")
+        os.replace(tmp_path, path)
+
+    async def agenerate_text(self, prompt, bypass_cache=False, params=None, task=None, prefix=None):
+        """Async version of generate_text, same arguments (runs the blocking call in a worker thread)."""
+        return await asyncio.to_thread(self.generate_text, prompt, bypass_cache=bypass_cache, params=params,
+                                       task=task, prefix=prefix)
+
+    async def agenerate_many(self, prompts, max_concurrency=None, params=None, task=None, prefix=None):
+        """Async version of generate_many: same ordering, limits and per-item error isolation."""
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+
+        async def generate_one(prompt):
+            async with semaphore:
+                return await self.agenerate_text(prompt, params=params, task=task, prefix=prefix)
+
+        return await asyncio.gather(*(generate_one(p) for p in prompts))
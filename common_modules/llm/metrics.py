@@ -0,0 +1,125 @@
+import os
+import csv
+import json
+import time
+import threading
+
+# List prices in USD per 1M tokens (input, output), for the cost estimate.
+# LLM_PRICE_INPUT / LLM_PRICE_OUTPUT override them for every model.
+PRICES = {
+    "gemini-3-pro-preview": (2.00, 12.00),
+    "gemini-2.5-flash": (0.30, 2.50),
+}
+# Cached-context input tokens cost this share of the input price (storage is not included)
+CACHED_PRICE_RATIO = 0.10
+# Batch jobs are billed at this share of the interactive prices
+BATCH_PRICE_RATIO = 0.50
+
+FIELDS = ["timestamp", "task", "model", "source", "prompt_chars", "prompt_tokens", "cached_tokens",
+          "output_tokens", "latency", "retries", "error"]
+
+
+class LLMMetrics:
+    """
+    Per-call LLM metrics of one client: prompt size, tokens, latency, retries,
+    where the answer came from (api / cache / coalesced) and the error class of failures.
+    """
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def record(self, result, prompt, latency, task=None):
+        """Records one request from its LLMResult / LLMError. task: routing key it was sent with."""
+        entry = {
+            "timestamp": time.time(),
+            "task": task,
+            "model": result.model_id,
+            "source": result.source,
+            "prompt_chars": len(prompt),
+            "prompt_tokens": result.prompt_tokens,
+            "cached_tokens": result.cached_tokens,
+            "output_tokens": result.output_tokens,
+            "latency": round(latency, 3),
+            "retries": result.retries,
+            "error": None if result.ok else result.error_class
+        }
+        with self._lock:
+            self.records.append(entry)
+
+    def summary(self):
+        """Aggregates per model: {model: {calls, api_calls, cache_hits, ..., cost_usd}}."""
+        with self._lock:
+            records = list(self.records)
+
+        models = {}
+        for r in records:
+            m = models.setdefault(r["model"], {
+                "calls": 0, "api_calls": 0, "batch_calls": 0, "cache_hits": 0, "coalesced": 0, "errors": {},
+                "retries": 0, "prompt_tokens": 0, "cached_tokens": 0, "output_tokens": 0,
+                "cost_usd": 0.0, "latencies": []
+            })
+            m["calls"] += 1
+            m["retries"] += r["retries"]
+            m["latencies"].append(r["latency"])
+            if r["error"]:
+                m["errors"][r["error"]] = m["errors"].get(r["error"], 0) + 1
+            if r["source"] == "cache":
+                m["cache_hits"] += 1
+            elif r["source"] == "coalesced":
+                m["coalesced"] += 1
+            else:
+                m["batch_calls" if r["source"] == "batch" else "api_calls"] += 1
+                # Only API calls (and batch requests) cost tokens
+                prompt_tokens, cached_tokens, output_tokens = \
+                    r["prompt_tokens"] or 0, r.get("cached_tokens") or 0, r["output_tokens"] or 0
+                m["prompt_tokens"] += prompt_tokens
+                m["cached_tokens"] += cached_tokens
+                m["output_tokens"] += output_tokens
+                cost = self.cost(r["model"], prompt_tokens, output_tokens, cached_tokens)
+                m["cost_usd"] += cost * BATCH_PRICE_RATIO if r["source"] == "batch" else cost
+
+        for model, m in models.items():
+            latencies = sorted(m.pop("latencies"))
+            m["latency_total"] = round(sum(latencies), 1)
+            m["latency_avg"] = round(sum(latencies) / len(latencies), 2)
+            m["latency_p95"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2)
+            m["cost_usd"] = round(m["cost_usd"], 4)
+        return models
+
+    @staticmethod
+    def cost(model, prompt_tokens, output_tokens, cached_tokens=0):
+        price_in, price_out = PRICES.get(model, (0.0, 0.0))
+        price_in = float(os.getenv("LLM_PRICE_INPUT", price_in))
+        price_out = float(os.getenv("LLM_PRICE_OUTPUT", price_out))
+        prompt_cost = (prompt_tokens - cached_tokens) * price_in + cached_tokens * price_in * CACHED_PRICE_RATIO
+        return (prompt_cost + output_tokens * price_out) / 1_000_000
+
+    def save(self, path):
+        """Writes the records to `path`: CSV if it ends with .csv, else JSON (records + summary)."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._lock:
+            records = list(self.records)
+        if path.endswith(".csv"):
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=FIELDS)
+                writer.writeheader()
+                writer.writerows(records)
+        else:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"summary": self.summary(), "records": records}, f, ensure_ascii=False, indent=2)
+        print(f"LLM metrics saved to {path}")
+
+    def markdown_table(self):
+        """Per-run LLM cost and latency table, to append to a report."""
+        summary = self.summary()
+        table = "## LLM Usage\n"
+        if not summary:
+            return table + "No LLM calls.\n"
+        table += "| Model | Calls | API / Batch / Cache / Coalesced | Errors | Retries | Prompt Tokens (Cached) | Output Tokens | Est. Cost (USD) | Latency avg / p95 / total (s) |\n"
+        table += "|---|---|---|---|---|---|---|---|---|\n"
+        for model, m in summary.items():
+            errors = ", ".join(f"{name} {count}" for name, count in m["errors"].items()) or "0"
+            table += (f"| {model} | {m['calls']} | {m['api_calls']} / {m['batch_calls']} / {m['cache_hits']} / {m['coalesced']} | {errors} | "
+                      f"{m['retries']} | {m['prompt_tokens']:,} ({m['cached_tokens']:,}) | {m['output_tokens']:,} | ${m['cost_usd']:.4f} | "
+                      f"{m['latency_avg']} / {m['latency_p95']} / {m['latency_total']} |\n")
+        return table
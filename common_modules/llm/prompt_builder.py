@@ -0,0 +1,85 @@
+import os
+import math
+
+# Per-prompt token budget when a builder is not given one (LLM_PROMPT_MAX_TOKENS)
+DEFAULT_MAX_TOKENS = 2000
+
+
+def count_tokens(text):
+    """
+    Token estimate without an API call: ~4 ASCII characters per token, one token per other
+    character (Hangul splits far finer than English).
+    """
+    text = text or ""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+def format_number(value, digits=2):
+    """Fixed precision without trailing zeros, K/M/B/T for large amounts: 152300000000 -> "152.3B"."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    if math.isnan(value):
+        return "N/A"
+    suffix = ""
+    for threshold, unit in ((1e12, "T"), (1e9, "B"), (1e6, "M"), (1e3, "K")):
+        if abs(value) >= threshold:
+            value, suffix = value / threshold, unit
+            break
+    text = f"{value:.{digits}f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return text + suffix
+
+
+def format_history(history, digits=2):
+    """{year: amount} as one line in year order: "2020: 100B, 2021: 120B"."""
+    return ", ".join(f"{year}: {format_number(amount, digits)}" for year, amount in sorted(history.items()))
+
+
+def format_value(value):
+    if isinstance(value, dict):
+        return format_history(value) if value else "N/A"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return format_number(value)
+    return str(value)
+
+
+class PromptBuilder:
+    """
+    Renders a prompt template with compact field values (format_value) and keeps it within
+    max_tokens (count_tokens). trim: field names, least valuable first. While the prompt is over
+    budget, a history field (dict) drops its oldest entry, any other field becomes "N/A".
+    """
+    def __init__(self, template, max_tokens=None, trim=()):
+        self.template = template
+        if max_tokens is None:
+            max_tokens = int(os.getenv("LLM_PROMPT_MAX_TOKENS", DEFAULT_MAX_TOKENS))
+        self.max_tokens = max_tokens
+        self.trim = tuple(trim)
+        self.trimmed = 0
+
+    def render(self, fields):
+        return self.template.format(**{name: format_value(value) for name, value in fields.items()})
+
+    def build(self, **fields):
+        prompt = self.render(fields)
+        if count_tokens(prompt) <= self.max_tokens:
+            return prompt
+
+        self.trimmed += 1
+        for name in self.trim:
+            while count_tokens(prompt) > self.max_tokens:
+                value = fields.get(name)
+                if isinstance(value, dict) and len(value) > 1:
+                    fields[name] = dict(sorted(value.items())[1:])
+                elif value != "N/A":
+                    fields[name] = "N/A"
+                else:
+                    break
+                prompt = self.render(fields)
+        if count_tokens(prompt) > self.max_tokens:
+            print(f"Prompt is {count_tokens(prompt)} tokens after trimming (budget {self.max_tokens}).")
+        return prompt
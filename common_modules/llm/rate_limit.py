@@ -0,0 +1,88 @@
+import re
+import time
+import threading
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the provider is saturated (circuit open)."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive rate-limit failures: calls then fail fast for
+    `cooldown` seconds. After that one trial call is let through (half-open); its success closes
+    the circuit again, its failure re-opens it. Every call allow() lets through must end in
+    record_success(), record_failure() or release() - else the trial never ends.
+    """
+    def __init__(self, failure_threshold=5, cooldown=60.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def release(self):
+        """Ends a call that says nothing about saturation (e.g. a server error): the next call may be the trial."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._trial_running:
+                    print(f"LLM circuit breaker open: provider saturated, failing fast for {self.cooldown:.0f}s.")
+                self.opened_at = time.monotonic()
+                self._trial_running = False
+
+
+def is_rate_limited(error):
+    error_str = str(error)
+    return getattr(error, "code", None) == 429 or "429" in error_str or "RESOURCE_EXHAUSTED" in error_str
+
+
+def retry_after(error):
+    """
+    Server retry hint of a rate-limit error in seconds (Retry-After header, google.rpc.RetryInfo
+    retryDelay, or "retry in Ns" in the message), or None if there is none.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("Retry-After"):
+            return float(headers["Retry-After"])
+    except (TypeError, ValueError):
+        pass
+
+    match = re.search(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", str(getattr(error, "details", "")) + str(error)) \
+        or re.search(r"retry in (\d+(?:\.\d+)?)\s*s", str(error), re.IGNORECASE)
+    return float(match.group(1)) if match else None
@@ -0,0 +1,100 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+
+class ResponseCache:
+    """
+    Persistent, content-addressed cache of LLM responses: one JSON file per
+    hash of (model_id, prompt, generation params) in `directory`.
+    Entries expire after ttl_seconds; beyond max_entries the least recently
+    used ones (file mtime, refreshed on every hit) are evicted.
+    """
+    def __init__(self, directory, ttl_seconds=24 * 3600, max_entries=2000):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(model_id, prompt, params=None):
+        payload = json.dumps([model_id, prompt, params or {}], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns the cached text, or None on a miss / expired entry."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+
+        if entry is not None and time.time() - entry["created"] > self.ttl_seconds:
+            self._remove(path)
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.saved_seconds += entry.get("latency", 0.0)
+
+        # Mark as recently used for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry["text"]
+
+    def put(self, key, text, latency=0.0, model_id=None):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "model_id": model_id,
+                "created": time.time(),
+                "latency": latency,
+                "text": text
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                self._remove(os.path.join(self.directory, name))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "saved_seconds": round(self.saved_seconds, 1)
+            }
+
+    def _evict(self):
+        with self._lock:
+            entries = [os.path.join(self.directory, n) for n in os.listdir(self.directory) if n.endswith(".json")]
+            if len(entries) <= self.max_entries:
+                return
+            entries.sort(key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+            for path in entries[:len(entries) - self.max_entries]:
+                self._remove(path)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
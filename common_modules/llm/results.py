@@ -0,0 +1,47 @@
+class LLMResult:
+    """
+    Outcome of one LLM request. `ok` tells success from failure (LLMError);
+    str(result) is the response text, so results print like the plain strings they replace.
+    source: "api", "batch" (batch job), "cache" (response cache) or "coalesced" (joined an identical request in flight).
+    """
+    ok = True
+
+    def __init__(self, text, model_id=None, prompt_tokens=None, output_tokens=None, retries=0, source="api",
+                 cached_tokens=None):
+        self.text = text or ""
+        self.model_id = model_id
+        self.prompt_tokens = prompt_tokens
+        self.output_tokens = output_tokens
+        # Part of prompt_tokens the provider served from its cache (billed at a discount)
+        self.cached_tokens = cached_tokens
+        self.retries = retries
+        self.source = source
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.source}, {len(self.text)} chars)"
+
+
+class LLMError(LLMResult):
+    """
+    Failed LLM request, returned instead of raising (and instead of an "Error calling LLM: ..." string).
+    error_class: exception class name, e.g. "ClientError", "CircuitOpenError", "NotInitialized".
+    """
+    ok = False
+
+    def __init__(self, error_class, message, model_id=None, retries=0):
+        super().__init__("", model_id=model_id, retries=retries)
+        self.error_class = error_class
+        self.message = message
+
+    @classmethod
+    def from_exception(cls, error, model_id=None, retries=0):
+        return cls(type(error).__name__, str(error), model_id=model_id, retries=retries)
+
+    def __str__(self):
+        return f"{self.error_class}: {self.message}"
+
+    def __repr__(self):
+        return f"LLMError({self})"
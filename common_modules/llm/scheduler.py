@@ -0,0 +1,139 @@
+import os
+import time
+import threading
+from .prompt_builder import count_tokens
+
+
+class LLMBudget:
+    """
+    Per-run LLM budget. Any limit left as None is unlimited.
+    max_calls: LLM requests, max_tokens: estimated prompt + response tokens,
+    max_seconds: wall time since the scheduler was created.
+    """
+    def __init__(self, max_calls=None, max_tokens=None, max_seconds=None):
+        self.max_calls = max_calls
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+
+    @classmethod
+    def from_env(cls, max_calls=None, max_tokens=None, max_seconds=None, default_calls=None):
+        """Explicit limits win over LLM_BUDGET_CALLS / LLM_BUDGET_TOKENS / LLM_BUDGET_SECONDS."""
+        def pick(value, env_name, default=None):
+            if value is not None:
+                return value
+            env_value = os.getenv(env_name)
+            return float(env_value) if env_value else default
+        return cls(
+            max_calls=pick(max_calls, "LLM_BUDGET_CALLS", default_calls),
+            max_tokens=pick(max_tokens, "LLM_BUDGET_TOKENS"),
+            max_seconds=pick(max_seconds, "LLM_BUDGET_SECONDS")
+        )
+
+    def to_dict(self):
+        return {"max_calls": self.max_calls, "max_tokens": self.max_tokens, "max_seconds": self.max_seconds}
+
+
+class BudgetScheduler:
+    """
+    Hands out an LLMBudget to work items in priority order.
+    Callers sort their work with prioritize(), then ask admit() before each request: the call and its
+    estimated prompt tokens are reserved up front, so concurrent requests can never overshoot the budget.
+    Once an item does not fit, the budget counts as reached: it and every later item are recorded
+    in `skipped` instead of being sent (no lower-priority work squeezes into what is left).
+    A pass that is followed by more important work (e.g. triage before final scoring) is admitted
+    with share < 1: it may only use that fraction of each limit, and running out of it closes that
+    share only, so the rest stays available to the later pass.
+    """
+    def __init__(self, budget=None):
+        self.budget = budget or LLMBudget()
+        self.started = time.monotonic()
+        self.calls = 0
+        self.tokens = 0
+        # Skipped item ids, each once, in the order they were refused
+        self.skipped = []
+        self._skipped_ids = set()
+        self.exhausted = False
+        self._closed_shares = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def estimate_tokens(text):
+        # Same estimate as the prompt builder's token budget
+        return count_tokens(text)
+
+    @staticmethod
+    def prioritize(items, key):
+        """Highest expected value first. key(item) -> sortable value (e.g. (quant_score, market_cap))."""
+        return sorted(items, key=key, reverse=True)
+
+    def admit(self, item_ids, prompt=None, calls=1, share=1.0):
+        """
+        Reserves `calls` requests (and the prompt's estimated tokens) for item_ids.
+        share: fraction of each limit that admissions of this pass may fill (1 = all of it).
+        Returns False - and records item_ids as skipped - once the budget cannot cover them.
+        """
+        if isinstance(item_ids, str):
+            item_ids = [item_ids]
+        tokens = self.estimate_tokens(prompt) if prompt is not None else 0
+        limits = self.budget
+        with self._lock:
+            fits = not self.exhausted and share not in self._closed_shares and not (
+                (limits.max_calls is not None and self.calls + calls > limits.max_calls * share) or
+                (limits.max_tokens is not None and self.tokens + tokens > limits.max_tokens * share) or
+                (limits.max_seconds is not None and self.elapsed() >= limits.max_seconds * share)
+            )
+            if not fits:
+                if share >= 1:
+                    self.exhausted = True
+                else:
+                    self._closed_shares.add(share)
+                self._skip(item_ids)
+                return False
+            self.calls += calls
+            self.tokens += tokens
+            return True
+
+    def closed(self, share=1.0):
+        """True once admit() refuses everything of this share (the budget, or that share of it, is used up)."""
+        with self._lock:
+            return self.exhausted or share in self._closed_shares
+
+    def skip(self, item_ids):
+        """Records item_ids as skipped by the budget without asking for them (e.g. after closed())."""
+        with self._lock:
+            self._skip(item_ids)
+
+    def charge(self, response, prompt=None):
+        """
+        Adds a response's output tokens (as reported by the API, else estimated from its text; none
+        for a failed request) to the spend, whether the request succeeded or not. With the prompt,
+        the attempts the client retried count as calls and prompt tokens too.
+        """
+        tokens = getattr(response, "output_tokens", None)
+        if tokens is None:
+            tokens = self.estimate_tokens(str(response)) if getattr(response, "ok", True) else 0
+        retries = (getattr(response, "retries", 0) or 0) if prompt is not None else 0
+        if retries:
+            tokens += retries * self.estimate_tokens(prompt)
+        with self._lock:
+            self.calls += retries
+            self.tokens += tokens
+
+    def _skip(self, item_ids):
+        for item_id in item_ids:
+            if item_id not in self._skipped_ids:
+                self._skipped_ids.add(item_id)
+                self.skipped.append(item_id)
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def summary(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "tokens": self.tokens,
+                "seconds": round(self.elapsed(), 1),
+                "skipped": list(self.skipped),
+                "budget": self.budget.to_dict()
+            }
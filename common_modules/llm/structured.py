@@ -0,0 +1,152 @@
+import re
+import json
+
+
+def json_config(response_schema=None):
+    """Generation params asking the model for JSON output (constrained by response_schema if given)."""
+    params = {"response_mime_type": "application/json"}
+    if response_schema is not None:
+        params["response_schema"] = response_schema
+    return params
+
+
+def extract_json(text):
+    """
+    Tolerant JSON extraction from an LLM response.
+    Takes the first JSON object or array in the text (ignoring code fences and any prose around it),
+    drops trailing commas and closes brackets left open by a truncated response
+    (cutting back to the last complete member if needed).
+    Raises ValueError if nothing parseable is found.
+    """
+    if not text:
+        raise ValueError("Empty response")
+
+    match = re.search(r"[\[{]", text)
+    if not match:
+        raise ValueError("No JSON object or array in response")
+
+    out = []
+    stack = []
+    # (position, open brackets) after each complete member, to cut a truncated response back to
+    cut_points = []
+    in_string = False
+    escaped = False
+    for char in text[match.start():]:
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            _strip_trailing_comma(out)
+            if not stack or stack.pop() != char:
+                raise ValueError("Mismatched brackets in response")
+        elif char == ",":
+            cut_points.append((len(out), list(stack)))
+        out.append(char)
+        if not stack:
+            break
+
+    if not stack:
+        candidates = ["".join(out)]
+    else:
+        # Truncated response: close whatever is still open, or drop the incomplete last member
+        if in_string:
+            out.append('"')
+        candidates = [_close(out, stack)] + [_close(out[:pos], open_) for pos, open_ in reversed(cut_points)]
+
+    error = None
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError as e:
+            error = error or e
+    raise ValueError(f"Unrepairable JSON: {error}")
+
+
+def _close(out, stack):
+    out = list(out)
+    for closer in reversed(stack):
+        _strip_trailing_comma(out)
+        out.append(closer)
+    return "".join(out)
+
+
+def _strip_trailing_comma(out):
+    i = len(out) - 1
+    while i >= 0 and out[i].isspace():
+        i -= 1
+    if i >= 0 and out[i] == ",":
+        del out[i]
+
+
+class ScoreSchema:
+    """
+    Expected shape of a scoring response.
+    scores: {field: allowed values}, e.g. {"management_score": [0, 5, 10]}
+    text_fields: free-text fields (e.g. "reasoning")
+    """
+    def __init__(self, scores, text_fields=()):
+        self.scores = {field: sorted(values) for field, values in scores.items()}
+        self.text_fields = tuple(text_fields)
+
+    def response_schema(self, key_field=None, array=False):
+        """
+        Response schema for the API's structured output.
+        key_field: extra required string field identifying the item (e.g. "ticker" in batches).
+        """
+        properties = {field: {"type": "INTEGER", "minimum": allowed[0], "maximum": allowed[-1]}
+                      for field, allowed in self.scores.items()}
+        properties.update({field: {"type": "STRING"} for field in self.text_fields})
+        required = list(self.scores)
+        if key_field:
+            properties[key_field] = {"type": "STRING"}
+            required.insert(0, key_field)
+        schema = {"type": "OBJECT", "properties": properties, "required": required}
+        return {"type": "ARRAY", "items": schema} if array else schema
+
+    def repair(self, data, fill_missing=False):
+        """
+        Returns a copy of `data` with every score coerced to a number and snapped to the nearest
+        allowed value ("7점" -> 7, 12 -> 10, 4 -> 5). Missing or unreadable scores are set to the
+        lowest allowed value if fill_missing, otherwise the item is rejected (None).
+        """
+        if not isinstance(data, dict):
+            return None
+        repaired = dict(data)
+        for field, allowed in self.scores.items():
+            value = _to_number(data.get(field))
+            if value is None:
+                if not fill_missing:
+                    return None
+                value = allowed[0]
+            # Nearest allowed value, the lower one on a tie
+            repaired[field] = min(allowed, key=lambda a: (abs(a - value), a))
+        for field in self.text_fields:
+            if repaired.get(field) is None:
+                repaired[field] = ""
+            elif not isinstance(repaired[field], str):
+                repaired[field] = str(repaired[field])
+        return repaired
+
+    def max_total(self):
+        """Highest possible sum of the scores (upper bound for pruning)."""
+        return sum(allowed[-1] for allowed in self.scores.values())
+
+
+def _to_number(value):
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    match = re.search(r"-?\d+(\.\d+)?", str(value))
+    return float(match.group()) if match else None
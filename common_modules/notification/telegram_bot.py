@@ -1,17 +1,181 @@
 import os
+import time
+import queue
+import atexit
+import threading
 import telebot
 from dotenv import load_dotenv
+from common_modules.rate_limit import TokenBucket
 
 # Load .env from project root
 env_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../.env"))
 load_dotenv(env_path)
 
+# Telegram rejects messages over 4096 characters
+MAX_MESSAGE_LENGTH = 4000
+
+
+def split_message(message, limit=MAX_MESSAGE_LENGTH):
+    """Parts of at most `limit` characters, split at line ends (only lines longer than `limit` are cut)."""
+    parts, current = [], ""
+    for line in message.splitlines(keepends=True):
+        while len(line) > limit:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:limit])
+            line = line[limit:]
+        if len(current) + len(line) > limit:
+            parts.append(current)
+            current = ""
+        current += line
+    parts.append(current)
+    return [part.rstrip("\n") for part in parts if part.strip()]
+
+
+class NotificationQueue:
+    """
+    Background Telegram sender shared by every notifier of the process: send() returns at once.
+    A worker thread collects what arrives within `digest_seconds` of the first item, joins the texts
+    for the same bot and chat (from every screener bot of the process) into one digest - identical
+    texts once - and sends it split at line boundaries, then the files. Each bot and chat gets at
+    most `per_minute` messages (Telegram allows about one per second); 429s wait out Telegram's
+    retry_after, network and server errors are retried with backoff.
+    flush() - also run at exit, for at most EXIT_FLUSH_TIMEOUT seconds - blocks until everything
+    queued is sent.
+    """
+    MAX_RETRIES = 3
+    EXIT_FLUSH_TIMEOUT = 120
+
+    def __init__(self, digest_seconds=None, per_minute=None):
+        self.digest_seconds = float(digest_seconds if digest_seconds is not None else os.getenv("TELEGRAM_DIGEST_SECONDS", "2"))
+        self.per_minute = float(per_minute if per_minute is not None else os.getenv("TELEGRAM_RATE_PER_MINUTE", "60"))
+        self.sent = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._limits = {}
+        self._flushing = threading.Event()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def send(self, bot, chat_id, text=None, file_path=None):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="telegram-notifications", daemon=True)
+                self._worker.start()
+                atexit.register(self.flush, self.EXIT_FLUSH_TIMEOUT)
+        self._queue.put((bot, chat_id, text, file_path))
+
+    def flush(self, timeout=None):
+        """Waits until every queued message is sent (or given up). Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._flushing.set()
+        try:
+            with self._queue.all_tasks_done:
+                while self._queue.unfinished_tasks:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._queue.all_tasks_done.wait(remaining)
+            return True
+        finally:
+            self._flushing.clear()
+
+    def stats(self):
+        return {"sent": self.sent, "failed": self.failed, "queued": self._queue.unfinished_tasks}
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            # Collect a digest window's worth (cut short by flush())
+            deadline = time.monotonic() + self.digest_seconds
+            while not self._flushing.is_set() and time.monotonic() < deadline:
+                try:
+                    items.append(self._queue.get(timeout=min(0.2, max(0.0, deadline - time.monotonic()))))
+                except queue.Empty:
+                    pass
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._deliver(items)
+            except Exception as e:
+                print(f"Failed to send Telegram notifications: {e}")
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    def _deliver(self, items):
+        chats = {}
+        for bot, chat_id, text, file_path in items:
+            chat = chats.setdefault((bot.token, chat_id), {"bot": bot, "texts": [], "files": []})
+            if text and text not in chat["texts"]:
+                chat["texts"].append(text)
+            if file_path:
+                chat["files"].append(file_path)
+
+        for (token, chat_id), chat in chats.items():
+            bot = chat["bot"]
+            if chat["texts"]:
+                parts = split_message("\n\n".join(chat["texts"]))
+                ok = all([self._call((token, chat_id), lambda part=part: bot.send_message(chat_id, part)) for part in parts])
+                if ok:
+                    print(f"Telegram message sent ({len(chat['texts'])} messages, {len(parts)} parts).")
+            for file_path in chat["files"]:
+                if self._call((token, chat_id), lambda: self._send_document(bot, chat_id, file_path)):
+                    print("File sent via Telegram.")
+
+    @staticmethod
+    def _send_document(bot, chat_id, file_path):
+        with open(file_path, 'rb') as f:
+            bot.send_document(chat_id, f)
+
+    def _call(self, chat, func):
+        # Rate limits are per bot and chat
+        limit = self._limits.setdefault(chat, TokenBucket(self.per_minute, burst=1))
+        for attempt in range(self.MAX_RETRIES + 1):
+            wait = limit.reserve()
+            while wait > 0:
+                time.sleep(wait)
+                wait = limit.reserve()
+            try:
+                func()
+                self.sent += 1
+                return True
+            except Exception as e:
+                delay = _retry_delay(e, attempt)
+                if delay is None or attempt == self.MAX_RETRIES:
+                    self.failed += 1
+                    print(f"Failed to send Telegram message: {e}")
+                    return False
+                print(f"Telegram error ({e}), retrying in {delay:.0f}s...")
+                limit.pause(delay)
+        return False
+
+
+def _retry_delay(error, attempt):
+    """Seconds to wait before retrying a failed call, or None if retrying cannot help (e.g. bad chat id)."""
+    code = getattr(error, "error_code", None)
+    if code == 429:
+        result = getattr(error, "result_json", None) or {}
+        return float(result.get("parameters", {}).get("retry_after", 2 ** attempt))
+    if code is None or code >= 500:
+        # Network errors and server errors
+        return float(2 ** attempt)
+    return None
+
+
 class TelegramNotifier:
+    # Process-wide: digests and rate limits span every notifier (and bot) of the process
+    _queue = NotificationQueue()
+
     def __init__(self):
         self.token = os.getenv("TELEGRAM_BOT_TOKEN")
         self.chat_id = os.getenv("TELEGRAM_CHAT_ID")
         self.bot = None
-        
+
         if self.token:
             self.bot = telebot.TeleBot(self.token)
         else:
@@ -19,32 +183,22 @@ class TelegramNotifier:
 
     def send_message(self, message):
         """
-        Sends a text message to the configured chat ID.
+        Queues a text message to the configured chat ID and returns right away
+        (sent in the background, see NotificationQueue).
         """
         if not self.bot or not self.chat_id:
             print("Telegram not configured. Message not sent.")
             print(f"Content: {message[:50]}...")
             return
 
-        try:
-            # Telegram has a message length limit (4096 chars). Split if needed.
-            if len(message) > 4000:
-                chunks = [message[i:i+4000] for i in range(0, len(message), 4000)]
-                for chunk in chunks:
-                    self.bot.send_message(self.chat_id, chunk)
-            else:
-                self.bot.send_message(self.chat_id, message)
-            print("Telegram message sent.")
-        except Exception as e:
-            print(f"Failed to send Telegram message: {e}")
+        self._queue.send(self.bot, self.chat_id, text=message)
 
     def send_file(self, file_path):
         if not self.bot or not self.chat_id:
             return
-        
-        try:
-            with open(file_path, 'rb') as f:
-                self.bot.send_document(self.chat_id, f)
-            print("File sent via Telegram.")
-        except Exception as e:
-            print(f"Failed to send file: {e}")
+
+        self._queue.send(self.bot, self.chat_id, file_path=file_path)
+
+    def flush(self, timeout=None):
+        """Blocks until the queued messages are sent (also done automatically at exit)."""
+        return self._queue.flush(timeout)
@@ -1,10 +1,14 @@
 import os
+import re
 import shutil
 import git
 from datetime import datetime
 from urllib.parse import quote
 
 class WikiPublisher:
+    # Pushes rejected because the wiki moved on are rebased onto the new tip and retried this often
+    PUSH_ATTEMPTS = 3
+
     def __init__(self, repo_url=None):
         self.repo_url = repo_url
         if not self.repo_url:
@@ -44,22 +48,21 @@ class WikiPublisher:
             return False
 
         try:
-            repo = self._get_repo()
-            
             # Create filename from title
             filename = f"{page_title.replace(' ', '_')}.md"
             file_path = os.path.join(self.local_path, filename)
+            attachments = [a for a in (attachments or []) if os.path.exists(a)]
+            attachment_files = [f"images/{os.path.basename(a)}" for a in attachments]
+            
+            # Only the paths written here are checked out, on top of the remote tip
+            repo = self._get_repo([filename] + attachment_files)
             
             # Copy attachments if any
-            attachment_files = []
             if attachments:
                 images_dir = os.path.join(self.local_path, "images")
                 os.makedirs(images_dir, exist_ok=True)
                 for attachment in attachments:
-                    if os.path.exists(attachment):
-                        shutil.copy(attachment, images_dir)
-                        att_name = os.path.basename(attachment)
-                        attachment_files.append(os.path.join("images", att_name))
+                    shutil.copy(attachment, images_dir)
             
             # Write content
             with open(file_path, "w", encoding="utf-8") as f:
@@ -67,13 +70,12 @@ class WikiPublisher:
             
             # Update Home/Sidebar if needed (Optional, skipping for MVP)
             
-            # Commit and Push
-            if repo.is_dirty(untracked_files=True):
-                files_to_add = [filename] + attachment_files
-                repo.index.add(files_to_add)
-                repo.index.commit(f"Add report: {page_title}")
-                original_remote = repo.remote(name='origin')
-                original_remote.push()
+            # Commit and Push (git CLI: GitPython's index writer drops the sparse checkout flags)
+            files_to_add = [filename] + attachment_files
+            if repo.git.status("--porcelain", "--", *files_to_add):
+                repo.git.add("--", *files_to_add)
+                repo.git.commit("-m", f"Add report: {page_title}")
+                self._push(repo)
                 print(f"Successfully published to Wiki: {page_title}")
                 
                 # Construct Public URL
@@ -101,26 +103,60 @@ class WikiPublisher:
             print(f"Failed to publish to Wiki: {e}")
             return False
 
-    def _get_repo(self):
+    def _get_repo(self, paths):
+        """
+        Persistent shallow clone (depth 1, blobs on demand) with a sparse checkout of `paths` only,
+        reset to the remote tip - so a publish costs the same however long the wiki history gets.
+        """
         if os.path.exists(self.local_path):
             try:
                 repo = git.Repo(self.local_path)
-                # Pull latest
+            except (git.InvalidGitRepositoryError, git.NoSuchPathError) as e:
+                print(f"Error loading local repo: {e}. Re-cloning...")
+                shutil.rmtree(self.local_path)
+            else:
                 origin = repo.remotes.origin
                 
                 # Update remote URL if token changed or needed
                 if self.authed_repo_url and origin.url != self.authed_repo_url:
                     print("Updating remote URL with new credentials...")
                     origin.set_url(self.authed_repo_url)
-                    
-                origin.pull()
+                
+                self._sparse_checkout(repo, paths)
+                self._fetch_tip(repo)
+                repo.git.reset("--hard", "FETCH_HEAD")
                 return repo
-            except Exception as e:
-                print(f"Error loading local repo: {e}. Re-cloning...")
-                # If invalid repo, remove and re-clone
-                if os.path.exists(self.local_path):
-                    shutil.rmtree(self.local_path)
         
         print(f"Cloning Wiki from {self.repo_url}...")
         # Use authed URL for cloning/pushing
-        return git.Repo.clone_from(self.authed_repo_url, self.local_path)
+        repo = git.Repo.clone_from(self.authed_repo_url, self.local_path, depth=1, filter="blob:none", no_checkout=True)
+        self._sparse_checkout(repo, paths)
+        repo.git.checkout(repo.active_branch.name)
+        return repo
+
+    @staticmethod
+    def _sparse_checkout(repo, paths):
+        # Anchored, glob characters escaped: exactly these files
+        patterns = ["/" + re.sub(r"([*?\[\]])", r"\\\1", path) for path in paths]
+        repo.git.sparse_checkout("set", "--no-cone", *patterns)
+
+    @staticmethod
+    def _fetch_tip(repo):
+        repo.git.fetch("--depth", "1", "origin", repo.active_branch.name)
+
+    def _push(self, repo):
+        """Pushes the report commit; if the wiki moved on meanwhile, rebases it onto the new tip and retries."""
+        for attempt in range(self.PUSH_ATTEMPTS):
+            try:
+                repo.git.push("origin", f"HEAD:{repo.active_branch.name}")
+                return
+            except git.GitCommandError as e:
+                if attempt == self.PUSH_ATTEMPTS - 1 or "rejected" not in str(e):
+                    raise
+                print("Wiki changed during publish. Rebasing onto the new tip...")
+                self._fetch_tip(repo)
+                try:
+                    repo.git.rebase("--onto", "FETCH_HEAD", "HEAD~1")
+                except git.GitCommandError:
+                    repo.git.rebase("--abort")
+                    raise
@@ -0,0 +1,35 @@
+import time
+import threading
+
+
+class TokenBucket:
+    """
+    Request rate limit: `rate_per_minute` requests on average, bursts of up to `burst`.
+    reserve() never sleeps - it returns how long the caller should wait, so waiting requests can be
+    re-scheduled instead of tying up a worker thread. pause() stops all requests for a while
+    (e.g. for a server retry hint).
+    """
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst or max(1.0, self.rate * 10)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Takes a token and returns 0, or returns the seconds until one is available (taking nothing)."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
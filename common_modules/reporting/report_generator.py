@@ -28,7 +28,11 @@ class ReportGenerator:
         report += f"| Passed Profit (5yrs > 0) | {profit} | {self._pct(profit, pbr)} |\n"
         report += f"| Passed Cash Ratio (>= 30%) | {cash} | {self._pct(cash, profit)} |\n"
         report += f"| Passed Shareholder (>= 30%) | {holder} | {self._pct(holder, cash)} |\n"
-        report += f"| **Final Candidates** | **{stats.get('final_candidates', 0)}** | - |\n\n"
+        report += f"| **Final Candidates** | **{stats.get('final_candidates', 0)}** | - |\n"
+        skipped_llm = stats.get('skipped_llm', [])
+        if skipped_llm:
+            report += f"| Skipped LLM Analysis (Budget) | {len(skipped_llm)} | - |\n"
+        report += "\n"
         
         # 2. Candidate List
         report += "## 2. Candidate List\n"
@@ -0,0 +1,77 @@
+import os
+import json
+import threading
+from datetime import datetime
+
+
+class ScreeningCheckpoint:
+    """
+    Periodically saves per-ticker stage outcomes of a long screening run to a local JSON file,
+    so that a crashed or interrupted run can be resumed without redoing finished tickers.
+
+    Outcomes are grouped in sections (one per stage, e.g. "pbr", "dart", "llm").
+    """
+    def __init__(self, path, every=20, resume=False):
+        self.path = path
+        self.every = max(1, int(every))
+        self.sections = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+        if resume:
+            self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            print(f"No checkpoint found at {self.path}. Starting a fresh run.")
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.sections = data.get("sections", {})
+            counts = ", ".join(f"{k}: {len(v)}" for k, v in self.sections.items())
+            print(f"Resuming from checkpoint {self.path} ({data.get('saved_at')}) - {counts}")
+        except Exception as e:
+            print(f"Failed to load checkpoint ({e}). Starting a fresh run.")
+            self.sections = {}
+
+    def get(self, section, ticker):
+        """Returns the recorded outcome of a ticker for the stage, or None."""
+        with self._lock:
+            return self.sections.get(section, {}).get(ticker)
+
+    def has(self, section, ticker):
+        with self._lock:
+            return ticker in self.sections.get(section, {})
+
+    def record(self, section, ticker, outcome):
+        """Records an outcome. Written to disk every `every` records."""
+        with self._lock:
+            self.sections.setdefault(section, {})[ticker] = outcome
+            self._pending += 1
+            if self._pending >= self.every:
+                self._write()
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                self._write()
+
+    def complete(self):
+        """The job finished - the checkpoint is no longer needed."""
+        with self._lock:
+            self._pending = 0
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _write(self):
+        # Write to a temp file first so a crash mid-write never corrupts the checkpoint
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "saved_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "sections": self.sections
+            }, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, self.path)
+        self._pending = 0
@@ -0,0 +1,72 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+
+def fingerprint(*parts):
+    """Stable hash of the inputs a stage result was computed from."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class ResultStore:
+    """
+    Persists per-ticker stage results across runs together with the fingerprint of their inputs.
+    A later run reuses a stored result only if the fingerprint still matches (inputs unchanged)
+    and the result is younger than max_age_days (bounds data we cannot fingerprint cheaply,
+    e.g. shareholder tables). full=True ignores stored results but still refreshes them.
+    """
+    def __init__(self, path, max_age_days=7, full=False):
+        self.path = path
+        self.max_age = timedelta(days=max_age_days)
+        self.full = full
+        self.sections = {}
+        self.reused = 0
+        self.recomputed = 0
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.sections = json.load(f)
+        except Exception as e:
+            print(f"Failed to load result store ({e}). Re-screening everything.")
+            self.sections = {}
+
+    def lookup(self, section, ticker, fp):
+        """Returns the stored result if its inputs are unchanged, else None."""
+        with self._lock:
+            entry = self.sections.get(section, {}).get(ticker)
+            if self.full or not entry or entry["fingerprint"] != fp:
+                self.recomputed += 1
+                return None
+            saved_at = datetime.strptime(entry["saved_at"], "%Y-%m-%d %H:%M:%S")
+            if datetime.now() - saved_at > self.max_age:
+                self.recomputed += 1
+                return None
+            self.reused += 1
+            return entry["result"]
+
+    def store(self, section, ticker, fp, result):
+        with self._lock:
+            self.sections.setdefault(section, {})[ticker] = {
+                "fingerprint": fp,
+                "saved_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "result": result
+            }
+
+    def save(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.sections, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, self.path)
+
+    def stats(self):
+        return {"reused": self.reused, "recomputed": self.recomputed}
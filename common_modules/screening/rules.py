@@ -0,0 +1,107 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from .result_store import fingerprint
+
+
+class Ladder:
+    """
+    Score ladder: the first matching condition wins, like an if/elif/else chain.
+    steps: list of (expression, score), default: score when nothing matches.
+    Compiled to np.select over the whole feature frame.
+    """
+    def __init__(self, steps, default=0):
+        self.steps = [(expr, score) for expr, score in steps]
+        self.default = default
+
+    def evaluate(self, frame):
+        conditions = [_mask(frame, expr) for expr, _ in self.steps]
+        scores = [score for _, score in self.steps]
+        return pd.Series(np.select(conditions, scores, default=self.default), index=frame.index)
+
+    def to_dict(self):
+        return {"steps": [list(step) for step in self.steps], "default": self.default}
+
+
+class RuleSet:
+    """
+    Declarative screening rules over a ticker-indexed feature frame.
+
+    filters: {stage name: boolean expression}, in stage order, e.g. {"pbr": "pbr <= 0.6"}
+    scores:  {score name: Ladder}, e.g. {"score_per": Ladder([("per < 5", 20)], default=5)}
+
+    Expressions use pandas.eval syntax over the frame's columns (chained comparisons,
+    and/or/not). Missing features (NaN) never pass a filter.
+    """
+    def __init__(self, filters=None, scores=None):
+        self.filters = dict(filters or {})
+        self.scores = dict(scores or {})
+
+    @classmethod
+    def from_dict(cls, config):
+        scores = {}
+        for name, ladder in config.get("scores", {}).items():
+            scores[name] = ladder if isinstance(ladder, Ladder) else Ladder(ladder["steps"], ladder.get("default", 0))
+        return cls(config.get("filters", {}), scores)
+
+    def to_dict(self):
+        return {
+            "filters": self.filters,
+            "scores": {name: ladder.to_dict() for name, ladder in self.scores.items()}
+        }
+
+    def fingerprint(self):
+        return fingerprint(self.to_dict())
+
+    def evaluate(self, frame, stages=None):
+        """
+        Evaluates the filters (or only `stages`) and all score ladders in one pass.
+        Returns a frame with one boolean column per filter, "passed" (all of them)
+        and one column per score.
+        """
+        frame = _numeric(frame)
+        stages = list(self.filters) if stages is None else stages
+        result = pd.DataFrame(index=frame.index)
+        passed = pd.Series(True, index=frame.index)
+        for stage in stages:
+            result[stage] = _mask(frame, self.filters[stage])
+            passed &= result[stage]
+        result["passed"] = passed
+        for name, ladder in self.scores.items():
+            result[name] = ladder.evaluate(frame)
+        return result
+
+    def check(self, stage, **features):
+        """Single-ticker check of one filter, e.g. rules.check("cash", cash_ratio=0.42)."""
+        frame = _numeric(pd.DataFrame([features]))
+        return bool(_mask(frame, self.filters[stage]).iloc[0])
+
+    def score(self, **features):
+        """Single-ticker scores, e.g. rules.score(per=7.5, pbr=0.4) -> {"score_per": 15, ...}."""
+        frame = _numeric(pd.DataFrame([features]))
+        return {name: ladder.evaluate(frame).iloc[0].item() for name, ladder in self.scores.items()}
+
+
+def load_rules(path):
+    """Loads a RuleSet from a JSON or YAML file (YAML needs PyYAML)."""
+    with open(path, "r", encoding="utf-8") as f:
+        if os.path.splitext(path)[1].lower() in (".yml", ".yaml"):
+            import yaml
+            config = yaml.safe_load(f)
+        else:
+            config = json.load(f)
+    return RuleSet.from_dict(config)
+
+
+def _numeric(frame):
+    # Market data arrives as strings or objects at times ("-", "1,234")
+    return frame.apply(lambda col: pd.to_numeric(col.astype(str).str.replace(',', ''), errors='coerce')
+                       if not pd.api.types.is_numeric_dtype(col) else col)
+
+
+def _mask(frame, expr):
+    mask = frame.eval(expr)
+    if np.isscalar(mask):
+        mask = pd.Series(mask, index=frame.index)
+    return mask.fillna(False).astype(bool)
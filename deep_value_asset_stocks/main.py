@@ -1,15 +1,22 @@
 import sys
 import os
+import argparse
 import pandas as pd
 from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
 
 # Add parent directory to path to import common_modules
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from common_modules.data.dart_fetcher import DartFetcher
 from common_modules.data.market_fetcher import MarketDataFetcher
+from common_modules.data.run_cache import RunCache, CachedFetcher
 from common_modules.llm.llm_client import LLMClient
+from common_modules.llm.scheduler import BudgetScheduler, LLMBudget
 from common_modules.notification.telegram_bot import TelegramNotifier
+from common_modules.screening.checkpoint import ScreeningCheckpoint
+from common_modules.screening.result_store import ResultStore
+from common_modules.screening.rules import load_rules
 from src.logic.screener import Screener
 from src.llm.prompts import REPORT_PROMPT
 
@@ -19,8 +26,58 @@ def save_results_to_csv(results, filename="results.csv"):
     print(f"Results saved to {filename}")
     return filename
 
-def main():
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+CHECKPOINT_PATH = os.path.join(CACHE_DIR, "checkpoint.json")
+RESULT_STORE_PATH = os.path.join(CACHE_DIR, "results.json")
+METRICS_PATH = os.path.join(CACHE_DIR, "llm_metrics.json")
+
+def submit_analysis(llm_pool, llm, candidate, checkpoint, scheduler):
+    """
+    Future of the LLM report for one candidate (reused from the checkpoint on --resume).
+    The budget is admitted here, in the caller's thread, so it goes to candidates in submission order.
+    """
+    future = Future()
+    report = checkpoint.get("report", candidate['ticker'])
+    if report is not None:
+        future.set_result(report)
+        return future
+    
+    # Budgeted with the prompt that is actually sent
+    prompt = llm.analysis_prompt(candidate, REPORT_PROMPT)
+    if not scheduler.admit(candidate['ticker'], prompt):
+        print(f"LLM budget reached, skipping analysis of {candidate['name']}.")
+        fallback = f"### {candidate['name']} (Analysis Skipped)\nLLM budget of this run reached.\n\n"
+        fallback += f"- PBR: {candidate['pbr']}\n- Cash Ratio: {candidate['cash_ratio']:.2%}"
+        future.set_result(fallback)
+        return future
+    return llm_pool.submit(analyze_candidate, llm, candidate, checkpoint, scheduler, prompt)
+
+def analyze_candidate(llm, candidate, checkpoint, scheduler, prompt):
+    """LLM report for one admitted candidate. prompt: the rendered prompt it was admitted with."""
+    print(f"Analyzing {candidate['name']}...")
+    report = llm.analyze_company(candidate, REPORT_PROMPT)
+    # Failed calls (and retries) count against the budget too
+    scheduler.charge(report, prompt)
+    
+    # If LLM fails (e.g. quota), use fallback text
+    if not report.ok:
+        fallback = f"### {candidate['name']} (Analysis Failed)\nError: {report}\n\n"
+        fallback += f"- PBR: {candidate['pbr']}\n- Cash Ratio: {candidate['cash_ratio']:.2%}"
+        return fallback
+    
+    checkpoint.record("report", candidate['ticker'], report.text)
+    return report.text
+
+def main(resume=False, full=False, rules_path=None, bypass_llm_cache=False,
+         max_llm_calls=None, max_llm_tokens=None, max_llm_seconds=None):
     print(">>> Deep Value Asset Stock Bot Started")
+    checkpoint = ScreeningCheckpoint(CHECKPOINT_PATH, resume=resume)
+    # Per-ticker results of previous runs - only tickers whose inputs changed are re-screened
+    result_store = ResultStore(RESULT_STORE_PATH, full=full)
+    # Screening rules from a config file, or the screener's built-in defaults
+    rules = load_rules(rules_path) if rules_path else None
+    # LLM budget of this run (flags, then LLM_BUDGET_* env; unlimited by default)
+    scheduler = BudgetScheduler(LLMBudget.from_env(max_llm_calls, max_llm_tokens, max_llm_seconds))
     
     # 1. Initialize Modules
     # Check if we should use Mock mode
@@ -32,16 +89,20 @@ def main():
         use_mock = True
         dart_key = "MOCK"
     
-    dart = DartFetcher(api_key=dart_key)
+    # Memoize identical fetcher calls for the lifetime of this run
+    run_cache = RunCache()
+    dart = CachedFetcher(DartFetcher(api_key=dart_key), run_cache)
     
     # Check if DartFetcher fell back to MOCK mode
     if dart.api_key == "MOCK" and not use_mock:
         print("DartFetcher switched to MOCK mode. Switching MarketDataFetcher to MOCK mode as well.")
         use_mock = True
         
-    market = MarketDataFetcher(use_mock=use_mock)
-    screener = Screener(dart, market)
-    llm = LLMClient()
+    market = CachedFetcher(MarketDataFetcher(use_mock=use_mock), run_cache)
+    # Concurrency limit for the DART stages of the screener
+    max_workers = int(os.getenv("SCREENER_MAX_WORKERS", "8"))
+    screener = Screener(dart, market, max_workers=max_workers, result_store=result_store, rules=rules)
+    llm = LLMClient(bypass_cache=bypass_llm_cache)
     notifier = TelegramNotifier()
     
     # 2. Screening
@@ -55,33 +116,45 @@ def main():
         # Re-initialize modules in Mock Mode
         dart.api_key = "MOCK"
         dart.load_mock_data()
-        market = MarketDataFetcher(use_mock=True)
-        screener = Screener(dart, market)
+        run_cache.clear()
+        market = CachedFetcher(MarketDataFetcher(use_mock=True), run_cache)
+        screener = Screener(dart, market, max_workers=max_workers, result_store=result_store, rules=rules)
         tickers = market.get_all_stocks()
         print(f"Scanning {len(tickers)} tickers (MOCK)...")
         
-    candidate_list, stats = screener.run_screening(tickers)
-    
-    # 3. LLM Analysis & Reporting
-    print(f"Found {len(candidate_list)} candidates.")
-    
-    llm_reports = []
-    for candidate in candidate_list:
-        print(f"Analyzing {candidate['name']}...")
-        report = llm.analyze_company(candidate, REPORT_PROMPT)
+    # 2~3. Screening pipelined into LLM Analysis: each candidate is sent to the LLM as soon as
+    # it passes, while the screener keeps working through the rest of the universe.
+    # With a call or token limit the reports wait for the end of screening instead and go out
+    # cheapest first (lowest PBR, then highest cash ratio), so the budget reaches the same
+    # companies on every run rather than whichever finished screening first.
+    ranked = scheduler.budget.max_calls is not None or scheduler.budget.max_tokens is not None
+    stats = {}
+    streamed = []
+    report_futures = {}
+    with ThreadPoolExecutor(max_workers=llm.max_concurrency) as llm_pool:
+        for candidate in screener.iter_screening(tickers, checkpoint=checkpoint, stats=stats):
+            streamed.append(candidate)
+            if not ranked:
+                report_futures[candidate['ticker']] = submit_analysis(llm_pool, llm, candidate, checkpoint, scheduler)
+        print(f"Fetch cache: {run_cache.stats()}")
+        
+        for candidate in scheduler.prioritize(streamed, key=lambda c: (-c['pbr'], c['cash_ratio'])):
+            if candidate['ticker'] not in report_futures:
+                report_futures[candidate['ticker']] = submit_analysis(llm_pool, llm, candidate, checkpoint, scheduler)
         
-        # If LLM fails (e.g. quota), use fallback text
-        if "Error" in report:
-            fallback = f"### {candidate['name']} (Analysis Failed)\nError: {report}\n\n"
-            fallback += f"- PBR: {candidate['pbr']}\n- Cash Ratio: {candidate['cash_ratio']:.2%}"
-            llm_reports.append(fallback)
-        else:
-            llm_reports.append(report)
+        candidate_list = screener.sort_candidates(streamed, tickers)
+        print(f"Found {len(candidate_list)} candidates.")
+        llm_reports = [report_futures[c['ticker']].result() for c in candidate_list]
+    checkpoint.flush()
+    stats["llm_budget"] = scheduler.summary()
+    stats["skipped_llm"] = stats["llm_budget"]["skipped"]
 
     # Generate Markdown Report
     from common_modules.reporting.report_generator import ReportGenerator
     reporter = ReportGenerator()
     full_report = reporter.generate_markdown_report(stats, candidate_list, llm_reports)
+    full_report += "\n" + llm.metrics.markdown_table()
+    llm.metrics.save(METRICS_PATH)
     
     # 4. Publish to Wiki (First, to get the link)
     from common_modules.publishing.wiki_publisher import WikiPublisher
@@ -105,7 +178,23 @@ def main():
 
     # Save CSV
     csv_file = save_results_to_csv(candidate_list)
+    checkpoint.complete()
+    print(f"LLM response cache: {llm.cache_stats()}")
+    print(f"LLM budget: {stats['llm_budget']}")
+    # Wait for the queued Telegram messages, bounded so a Telegram outage cannot hang the job
+    if not notifier.flush(timeout=120):
+        print("Telegram notifications still pending after 120s, giving up on them.")
     print(">>> Job Completed.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Deep Value Asset Stock Bot")
+    parser.add_argument("--resume", action="store_true", help="Resume an interrupted run from its checkpoint, skipping completed tickers")
+    parser.add_argument("--full", action="store_true", help="Re-screen every ticker, ignoring results stored by previous runs")
+    parser.add_argument("--rules", help="JSON/YAML file with screening rules (filters and score ladders)")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Always call the LLM, ignoring cached responses")
+    parser.add_argument("--max-llm-calls", type=int, help="LLM request budget of the run (default: unlimited)")
+    parser.add_argument("--max-llm-tokens", type=int, help="Estimated LLM token budget of the run")
+    parser.add_argument("--max-llm-seconds", type=float, help="Wall-time budget for LLM analysis, in seconds")
+    args = parser.parse_args()
+    main(resume=args.resume, full=args.full, rules_path=args.rules, bypass_llm_cache=args.no_llm_cache,
+         max_llm_calls=args.max_llm_calls, max_llm_tokens=args.max_llm_tokens, max_llm_seconds=args.max_llm_seconds)
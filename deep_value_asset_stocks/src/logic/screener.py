@@ -1,75 +1,241 @@
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
+from common_modules.screening.result_store import fingerprint
+from common_modules.screening.rules import RuleSet
 
 class Screener:
-    def __init__(self, dart_fetcher, market_fetcher):
+    # DART stage inputs (finalized filings)
+    PROFIT_YEARS = [2020, 2021, 2022, 2023, 2024]
+    CASH_RATIO_YEAR = 2023
+    
+    # Default screening rules, one filter per funnel stage (see common_modules.screening.rules)
+    RULES = RuleSet.from_dict({
+        "filters": {
+            "pbr": "pbr <= 0.6",
+            "profit": "min_op_income > 0",
+            # Threshold: let's use 30% as placeholder, or maybe 20%? User said "High".
+            # Implementation Plan said 30% default.
+            "cash": "cash_ratio >= 0.3",
+            "shareholder": "shareholder_stake >= 30.0"
+        }
+    })
+
+    def __init__(self, dart_fetcher, market_fetcher, max_workers=8, result_store=None, rules=None):
         self.dart = dart_fetcher
         self.market = market_fetcher
         self.results = []
+        self.rules = rules or self.RULES
+        # Fundamentals frame of the current run (filled by screen_pbr)
+        self._fundamentals = pd.DataFrame()
+        # Number of tickers whose DART stages run concurrently
+        self.max_workers = max(1, int(max_workers))
+        # Optional ResultStore: DART stage results of unchanged tickers are reused across runs
+        self.result_store = result_store
+
+    def run_screening(self, tickers, checkpoint=None):
+        """
+        checkpoint: optional ScreeningCheckpoint. Per-ticker outcomes are recorded to it,
+        and tickers it already holds (--resume) are not re-checked.
+        Returns: (candidates in ticker order, stats)
+        """
+        stats = {}
+        candidates = list(self.iter_screening(tickers, checkpoint=checkpoint, stats=stats))
+        return self.sort_candidates(candidates, tickers), stats
 
-    def run_screening(self, tickers):
+    def iter_screening(self, tickers, checkpoint=None, stats=None):
+        """
+        Streaming version of run_screening: yields each candidate as soon as it passes all checks,
+        so the caller can start working on it while screening continues.
+        Candidates come in completion order (see sort_candidates). `stats` is filled in as
+        screening progresses and is final once the generator is exhausted.
+        """
         print(f"Starting screening for {len(tickers)} tickers...")
-        candidates = []
-        stats = {
+        if stats is None:
+            stats = {}
+        stats.update({
             "total_scanned": len(tickers),
             "passed_pbr": 0,
             "passed_profit": 0,
             "passed_cash": 0,
             "passed_shareholder": 0,
             "final_candidates": 0
-        }
+        })
         
-        for ticker in tickers:
-            corp_name = self.market.get_stock_name(ticker)
-            print(f"Checking {corp_name} ({ticker})...")
-            
-            # 1. PBR Check
-            pbr_ok, pbr_val = self.check_pbr(ticker)
-            if not pbr_ok:
-                print(f"  -> Failed PBR: {pbr_val}")
-                continue
-            stats["passed_pbr"] += 1
-            
-            # Get Corp Code for DART
-            corp_code = self.dart.find_corp_code(corp_name)
-            if not corp_code:
-                print(f"  -> Failed to find Corp Code for {corp_name}")
-                continue
-            
-            # 2. Consecutive Profit Check
-            profit_ok, profit_history = self.check_consecutive_profit(corp_code)
-            if not profit_ok:
-                 print(f"  -> Failed Profit Check")
-                 continue
-            stats["passed_profit"] += 1
-            
-            # 3. Cash Ratio Check
-            cash_ok, cash_ratio = self.check_cash_ratio(corp_code)
-            if not cash_ok:
-                print(f"  -> Failed Cash Ratio Check: {cash_ratio}")
-                continue
-            stats["passed_cash"] += 1
-
-            # 4. Shareholder Check
-            share_ok, share_sum = self.check_shareholder_ownership(corp_code)
-            if not share_ok:
-                print(f"  -> Failed Shareholder Check: {share_sum}%")
-                continue
-            stats["passed_shareholder"] += 1
-
-            # If all passed
-            print(f"  -> PASSED ALL CHECKS!")
-            candidates.append({
-                "ticker": ticker,
-                "name": corp_name,
-                "pbr": pbr_val,
-                "profit_history": profit_history,
-                "cash_ratio": cash_ratio,
-                "shareholder_stake": share_sum
-            })
+        def collect(future):
+            passed_stages, candidate = future.result()
+            for stage in passed_stages:
+                stats[f"passed_{stage}"] += 1
+            if candidate:
+                stats["final_candidates"] += 1
+            return candidate
+        
+        try:
+            # 2~4. DART stages (several blocking requests per ticker) run concurrently in the pool,
+            # starting as soon as a ticker passes the PBR check. Stats are plain counters, so they
+            # do not depend on which ticker finishes first.
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                pending = set()
+                
+                # 1. PBR Check - evaluated over the whole universe in one vectorized pass
+                todo = [t for t in tickers if not (checkpoint and checkpoint.has("pbr", t))]
+                pbr_stage = self.screen_pbr(todo)
+                
+                for ticker in tickers:
+                    saved = checkpoint.get("pbr", ticker) if checkpoint else None
+                    if saved is not None:
+                        corp_name, pbr_ok, pbr_val = saved["name"], saved["passed"], saved["pbr"]
+                    else:
+                        pbr_ok = bool(pbr_stage.at[ticker, "passed"])
+                        pbr_val = pbr_stage.at[ticker, "pbr"]
+                        pbr_val = "No Data" if pd.isna(pbr_val) else float(pbr_val)
+                        # Names are only needed (DART corp code lookup) for tickers that go on
+                        corp_name = self.market.get_stock_name(ticker) if pbr_ok else None
+                        if checkpoint:
+                            checkpoint.record("pbr", ticker, {"name": corp_name, "passed": pbr_ok, "pbr": pbr_val})
+                    
+                    if not pbr_ok:
+                        continue
+                    print(f"Checking {corp_name} ({ticker}): PBR {pbr_val}...")
+                    stats["passed_pbr"] += 1
+                    pending.add(pool.submit(self._screen_dart_stages_checkpointed, checkpoint, ticker, corp_name, pbr_val))
+                    
+                    # Hand over whatever already finished without waiting for the rest
+                    for future in [f for f in pending if f.done()]:
+                        pending.discard(future)
+                        candidate = collect(future)
+                        if candidate:
+                            yield candidate
+                
+                print(f"Waiting for DART checks of {len(pending)} tickers ({self.max_workers} workers)...")
+                for future in as_completed(pending):
+                    candidate = collect(future)
+                    if candidate:
+                        yield candidate
+        finally:
+            # Keep whatever was done so far, even on Ctrl-C or a crash
+            if checkpoint:
+                checkpoint.flush()
+            if self.result_store:
+                self.result_store.save()
+                print(f"Incremental screening: {self.result_store.stats()}")
+
+    def screen_pbr(self, tickers):
+        """
+        PBR stage for many tickers at once: one market-wide fundamentals request,
+        then the "pbr" rule as a vectorized mask. Returns a frame with "pbr" and "passed" columns.
+        """
+        self._fundamentals = self.market.get_fundamental_frame(tickers)
+        features = self._fundamentals.reindex(columns=["pbr"])
+        stage = self.rules.evaluate(features, stages=["pbr"])
+        stage["pbr"] = features["pbr"]
+        print(f"Passed PBR: {int(stage['passed'].sum())} / {len(tickers)}")
+        return stage
+
+    @staticmethod
+    def sort_candidates(candidates, tickers):
+        """Puts streamed candidates back in the order of the scanned ticker list."""
+        order = {ticker: i for i, ticker in enumerate(tickers)}
+        return sorted(candidates, key=lambda c: order[c["ticker"]])
+
+    def _screen_dart_stages_checkpointed(self, checkpoint, ticker, corp_name, pbr_val):
+        if checkpoint:
+            saved = checkpoint.get("dart", ticker)
+            if saved is not None:
+                candidate = saved["candidate"]
+                return saved["passed"], self._restore_candidate(candidate, pbr_val)
+
+        passed_stages, candidate = self._screen_dart_stages_incremental(ticker, corp_name, pbr_val)
+        if checkpoint:
+            checkpoint.record("dart", ticker, {"passed": passed_stages, "candidate": candidate})
+        return passed_stages, candidate
+
+    def _screen_dart_stages_incremental(self, ticker, corp_name, pbr_val):
+        if not self.result_store:
+            return self._screen_dart_stages(ticker, corp_name, pbr_val)
+
+        fp = self._dart_inputs_fingerprint(ticker, corp_name)
+        saved = self.result_store.lookup("dart", ticker, fp)
+        if saved is not None:
+            return saved["passed"], self._restore_candidate(saved["candidate"], pbr_val)
+
+        passed_stages, candidate = self._screen_dart_stages(ticker, corp_name, pbr_val)
+        self.result_store.store("dart", ticker, fp, {"passed": passed_stages, "candidate": candidate})
+        return passed_stages, candidate
+
+    def _dart_inputs_fingerprint(self, ticker, corp_name):
+        """
+        Fingerprint of what the DART stages depend on. Filings of past fiscal years are final,
+        so the year list identifies them; BPS/EPS only move when a new report is published.
+        """
+        if ticker in self._fundamentals.index:
+            fund = self._fundamentals.loc[ticker]
+        else:
+            fund = self.market.get_fundamental(ticker)
+            if fund is not None:
+                fund = fund.rename(str.lower)
+        bps = eps = None
+        if fund is not None:
+            bps, eps = fund.get("bps"), fund.get("eps")
+        return fingerprint(
+            ticker, corp_name, bps, eps,
+            self.PROFIT_YEARS, self.CASH_RATIO_YEAR, self.rules.fingerprint()
+        )
+
+    def _restore_candidate(self, candidate, pbr_val):
+        """Candidate loaded from JSON (checkpoint / result store), with today's PBR."""
+        if not candidate:
+            return candidate
+        candidate = dict(candidate)
+        # JSON turns the year keys into strings
+        candidate["profit_history"] = {int(k): v for k, v in candidate["profit_history"].items()}
+        candidate["pbr"] = pbr_val
+        return candidate
+
+    def _screen_dart_stages(self, ticker, corp_name, pbr_val):
+        """
+        Runs the DART based checks for one ticker, stopping at the first failed stage.
+        Returns: (list of passed stage names, candidate dict or None)
+        """
+        passed_stages = []
+        
+        # Get Corp Code for DART
+        corp_code = self.dart.find_corp_code(corp_name)
+        if not corp_code:
+            print(f"  [{corp_name}] -> Failed to find Corp Code")
+            return passed_stages, None
         
-        stats["final_candidates"] = len(candidates)
-        return candidates, stats
+        # 2. Consecutive Profit Check
+        profit_ok, profit_history = self.check_consecutive_profit(corp_code)
+        if not profit_ok:
+            print(f"  [{corp_name}] -> Failed Profit Check")
+            return passed_stages, None
+        passed_stages.append("profit")
+        
+        # 3. Cash Ratio Check
+        cash_ok, cash_ratio = self.check_cash_ratio(corp_code)
+        if not cash_ok:
+            print(f"  [{corp_name}] -> Failed Cash Ratio Check: {cash_ratio}")
+            return passed_stages, None
+        passed_stages.append("cash")
+
+        # 4. Shareholder Check
+        share_ok, share_sum = self.check_shareholder_ownership(corp_code)
+        if not share_ok:
+            print(f"  [{corp_name}] -> Failed Shareholder Check: {share_sum}%")
+            return passed_stages, None
+        passed_stages.append("shareholder")
+
+        # If all passed
+        print(f"  [{corp_name}] -> PASSED ALL CHECKS!")
+        return passed_stages, {
+            "ticker": ticker,
+            "name": corp_name,
+            "pbr": pbr_val,
+            "profit_history": profit_history,
+            "cash_ratio": cash_ratio,
+            "shareholder_stake": share_sum
+        }
 
     def check_pbr(self, ticker):
         fund = self.market.get_fundamental(ticker)
@@ -77,42 +243,29 @@ class Screener:
             return False, "No Data"
         try:
             pbr = float(fund["PBR"])
-            return (pbr <= 0.6), pbr
+            return self.rules.check("pbr", pbr=pbr), pbr
         except:
             return False, "Error"
 
     def check_consecutive_profit(self, corp_code):
         # Check last 5 years: 2020~2024 (assuming we are in early 2026, 2024 might be out, but let's check available)
-        years = [2020, 2021, 2022, 2023, 2024]
+        # Operating income comes from the shared DART helper (also used by the bluechip rules)
+        history = self.dart.get_operating_income_history(corp_code, tuple(self.PROFIT_YEARS))
         profit_history = {}
         
-        for year in years:
-            fs = self.dart.get_financial_summary(corp_code, year)
-            if fs is None or fs.empty:
+        for year, op_income in history.items():
+            if op_income is None:
                 return False, f"Missing Data {year}"
+            profit_history[year] = op_income
             
-            # Find Operating Income
-            # Account names can vary: 영업이익, Operating Income
-            # Mock data uses '영업이익'
-            try:
-                op_income_row = fs[fs['account_nm'].str.contains('영업이익|Operating Income')]
-                if op_income_row.empty:
-                     return False, f"No Op Income {year}"
-                
-                amount_str = op_income_row.iloc[0]['thstrm_amount'].replace(',', '')
-                op_income = float(amount_str)
-                profit_history[year] = op_income
-                
-                if op_income <= 0:
-                    return False, "Loss"
-            except Exception as e:
-                return False, f"Error {year}"
+            if not self.rules.check("profit", min_op_income=op_income):
+                return False, "Loss"
 
         return True, profit_history
 
     def check_cash_ratio(self, corp_code):
         # Check latest year (e.g., 2023)
-        target_year = 2023 
+        target_year = self.CASH_RATIO_YEAR
         fs = self.dart.get_financial_summary(corp_code, target_year)
         if fs is None or fs.empty:
             return False, "No Data"
@@ -137,9 +290,7 @@ class Screener:
             total_liquid = cash + short_fin
             ratio = total_liquid / assets
             
-            # Threshold: let's use 30% as placeholder, or maybe 20%? User said "High".
-            # Implementation Plan said 30% default.
-            return (ratio >= 0.3), ratio
+            return self.rules.check("cash", cash_ratio=ratio), ratio
             
         except Exception as e:
             print(f"Cash Check Error: {e}")
@@ -174,7 +325,7 @@ class Screener:
             # Dart API returns list. Usually sum of unique holders.
             # Let's assume the sum is correct.
             
-            return (total_stake >= 30.0), total_stake
+            return self.rules.check("shareholder", shareholder_stake=total_stake), total_stake
             
         except Exception as e:
             return False, f"Error: {e}"
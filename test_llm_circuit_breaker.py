@@ -0,0 +1,106 @@
+import sys
+import os
+import time
+import tempfile
+from types import SimpleNamespace
+
+# Add current directory to path
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from common_modules.llm.llm_client import LLMClient
+from common_modules.llm.rate_limit import CircuitBreaker
+from common_modules.rate_limit import TokenBucket
+
+
+class ServerError(Exception):
+    code = 500
+
+
+class StubBackend:
+    """Answers "ok", or raises the queued errors first."""
+    name = "stub"
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def generate(self, model, prompt, config=None):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return SimpleNamespace(text="ok", usage_metadata=None)
+
+
+class BlockedResponse:
+    """Like the SDK's response for a safety-blocked candidate: reading .text raises."""
+    usage_metadata = None
+
+    @property
+    def text(self):
+        raise ValueError("response was blocked")
+
+
+class BlockingBackend(StubBackend):
+    """Answers the first call with a blocked response, then "ok"."""
+    def generate(self, model, prompt, config=None):
+        self.calls += 1
+        if self.calls == 1:
+            return BlockedResponse()
+        return super().generate(model, prompt, config)
+
+
+def half_open_client(backend):
+    """Client with its own limiter and a breaker that is half-open right away."""
+    client = LLMClient(cache_dir=tempfile.mkdtemp(), backend=backend)
+    client._rate_limiter = TokenBucket(6000)
+    client._breaker = CircuitBreaker(failure_threshold=1, cooldown=0.05)
+    client._breaker.record_failure()
+    time.sleep(0.06)
+    assert client._breaker.state == "half-open"
+    return client
+
+
+def test_server_error_on_trial_releases_it():
+    backend = StubBackend([ServerError("500 INTERNAL")])
+    client = half_open_client(backend)
+
+    first = client.generate_text("a", bypass_cache=True)
+    assert not first.ok and first.error_class == "ServerError"
+
+    # The trial slot is free again: the next call goes out and closes the circuit
+    second = client.generate_text("b", bypass_cache=True)
+    assert second.ok, second
+    assert client._breaker.state == "closed"
+    assert backend.calls == 2
+
+
+def test_limiter_pause_does_not_hold_trial():
+    backend = StubBackend()
+    client = half_open_client(backend)
+    client._rate_limiter.pause(0.2)
+
+    # Re-dispatched by the limiter, then let through as the trial once the pause is over
+    result = client.generate_text("a", bypass_cache=True)
+    assert result.ok, result
+    assert client._breaker.state == "closed"
+    assert backend.calls == 1
+
+
+def test_unreadable_response_resolves_and_releases_trial():
+    backend = BlockingBackend()
+    client = half_open_client(backend)
+
+    # Resolved with an error instead of leaving the caller (and coalesced callers) waiting forever
+    first = client._submit(client.model_for(), "a").result(timeout=5)
+    assert not first.ok and first.error_class == "ValueError"
+
+    second = client.generate_text("b", bypass_cache=True)
+    assert second.ok, second
+    assert client._breaker.state == "closed"
+
+
+if __name__ == "__main__":
+    test_server_error_on_trial_releases_it()
+    test_limiter_pause_does_not_hold_trial()
+    test_unreadable_response_resolves_and_releases_trial()
+    print("SUCCESS")
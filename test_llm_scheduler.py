@@ -0,0 +1,96 @@
+import sys
+import os
+import time
+
+# Add current directory to path
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from common_modules.llm.results import LLMError, LLMResult
+from common_modules.llm.scheduler import BudgetScheduler, LLMBudget
+
+
+def test_calls_limit_skips_the_rest():
+    scheduler = BudgetScheduler(LLMBudget(max_calls=2))
+    assert scheduler.admit("a") and scheduler.admit(["b", "c"])
+    assert not scheduler.admit("d")
+    # Once the budget is reached nothing squeezes in, even work that would fit
+    scheduler.calls = 0
+    assert not scheduler.admit("e")
+    assert scheduler.exhausted and scheduler.closed()
+    assert scheduler.summary()["skipped"] == ["d", "e"]
+
+
+def test_tokens_are_reserved_up_front():
+    prompt = "x" * 400
+    tokens = BudgetScheduler.estimate_tokens(prompt)
+    scheduler = BudgetScheduler(LLMBudget(max_tokens=tokens * 2))
+    assert scheduler.admit("a", prompt) and scheduler.admit("b", prompt)
+    assert not scheduler.admit("c", "x")
+    assert scheduler.tokens == tokens * 2
+
+
+def test_seconds_limit():
+    scheduler = BudgetScheduler(LLMBudget(max_seconds=0.05))
+    assert scheduler.admit("a")
+    time.sleep(0.06)
+    assert not scheduler.admit("b")
+
+
+def test_share_closes_only_its_pass():
+    scheduler = BudgetScheduler(LLMBudget(max_calls=10))
+    admitted = [t for t in "abcdefghij" if scheduler.admit(t, share=0.7)]
+    assert admitted == list("abcdefg")
+    assert scheduler.closed(0.7) and not scheduler.closed()
+    # A later pass with the whole budget gets what the first one left
+    assert [t for t in "xyzw" if scheduler.admit(t)] == ["x", "y", "z"]
+    assert scheduler.closed()
+    assert scheduler.skipped == ["h", "i", "j", "w"]
+
+
+def test_charge_output_and_retries():
+    scheduler = BudgetScheduler()
+    prompt = "p" * 400
+    scheduler.charge(LLMResult("ok", output_tokens=30))
+    assert (scheduler.calls, scheduler.tokens) == (0, 30)
+    # Without usage data the text is estimated; retried attempts count as calls and prompt tokens
+    scheduler.charge(LLMResult("y" * 40, retries=2), prompt)
+    assert scheduler.calls == 2
+    assert scheduler.tokens == 30 + BudgetScheduler.estimate_tokens("y" * 40) + 2 * BudgetScheduler.estimate_tokens(prompt)
+
+
+def test_charge_failed_call():
+    scheduler = BudgetScheduler()
+    scheduler.charge(LLMError("ClientError", "429 RESOURCE_EXHAUSTED", retries=4), "p" * 400)
+    # No output for a failed call, but its retries were sent
+    assert scheduler.calls == 4
+    assert scheduler.tokens == 4 * BudgetScheduler.estimate_tokens("p" * 400)
+    scheduler.charge(LLMError("CircuitOpenError", "open"))
+    assert (scheduler.calls, scheduler.tokens) == (4, 4 * BudgetScheduler.estimate_tokens("p" * 400))
+
+
+def test_prioritize_and_skip():
+    items = [{"t": "a", "score": 1}, {"t": "b", "score": 3}, {"t": "c", "score": 2}]
+    assert [i["t"] for i in BudgetScheduler.prioritize(items, key=lambda i: i["score"])] == ["b", "c", "a"]
+    scheduler = BudgetScheduler()
+    scheduler.skip(["x", "y"])
+    assert scheduler.summary()["skipped"] == ["x", "y"]
+
+
+def test_skipped_once_per_item():
+    scheduler = BudgetScheduler(LLMBudget(max_calls=1))
+    assert scheduler.admit("a")
+    # e.g. several vote samples of one company refused in a row
+    for _ in range(3):
+        assert not scheduler.admit("b")
+    scheduler.skip(["b", "c"])
+    assert scheduler.summary()["skipped"] == ["b", "c"]
+
+
+def test_budget_from_env(monkeypatch):
+    monkeypatch.setenv("LLM_BUDGET_CALLS", "7")
+    monkeypatch.delenv("LLM_BUDGET_TOKENS", raising=False)
+    monkeypatch.delenv("LLM_BUDGET_SECONDS", raising=False)
+    assert LLMBudget.from_env(default_calls=20).to_dict() == {"max_calls": 7.0, "max_tokens": None, "max_seconds": None}
+    assert LLMBudget.from_env(max_calls=3, default_calls=20).max_calls == 3
+    monkeypatch.delenv("LLM_BUDGET_CALLS")
+    assert LLMBudget.from_env(default_calls=20).max_calls == 20
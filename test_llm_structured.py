@@ -0,0 +1,75 @@
+import sys
+import os
+import pytest
+
+# Add current directory to path
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from common_modules.llm.structured import ScoreSchema, extract_json
+
+SCHEMA = ScoreSchema({
+    "global_brand_score": [0, 5],
+    "growth_potential_score": [3, 5, 7, 10],
+    "management_score": [0, 5, 10]
+}, text_fields=("reasoning",))
+
+
+def test_extract_plain_and_fenced():
+    assert extract_json('{"a": 1}') == {"a": 1}
+    assert extract_json('Here you go:\n```json\n[{"a": 1}, {"a": 2}]\n```\nDone.') == [{"a": 1}, {"a": 2}]
+
+
+def test_extract_trailing_commas():
+    assert extract_json('{"a": [1, 2,], "b": 3,}') == {"a": [1, 2], "b": 3}
+
+
+def test_extract_brackets_inside_strings():
+    assert extract_json('{"reasoning": "PER {low}, [cheap]", "a": "say \\"hi\\""} trailing }') == \
+        {"reasoning": "PER {low}, [cheap]", "a": 'say "hi"'}
+
+
+def test_extract_truncated_response():
+    # Open brackets are closed; an incomplete last member is dropped
+    assert extract_json('[{"ticker": "005930", "score": 5}, {"ticker": "0006') == \
+        [{"ticker": "005930", "score": 5}, {"ticker": "0006"}]
+    assert extract_json('{"a": 1, "b": ') == {"a": 1}
+    assert extract_json('{"a": 1, "reasoning": "cut off mid sen') == {"a": 1, "reasoning": "cut off mid sen"}
+
+
+def test_extract_failures():
+    for text in ["", "no json here", '{"a": 1]', "{]"]:
+        with pytest.raises(ValueError):
+            extract_json(text)
+
+
+def test_repair_snaps_to_allowed_values():
+    data = {"global_brand_score": "5점", "growth_potential_score": 12, "management_score": 4,
+            "reasoning": None, "ticker": "005930"}
+    assert SCHEMA.repair(data) == {"global_brand_score": 5, "growth_potential_score": 10, "management_score": 5,
+                                   "reasoning": "", "ticker": "005930"}
+    # Ties go to the lower value
+    assert SCHEMA.repair({"global_brand_score": 2.5, "growth_potential_score": 4, "management_score": 7.5,
+                          "reasoning": 1})["global_brand_score"] == 0
+    # The input is not modified
+    assert data["growth_potential_score"] == 12
+
+
+def test_repair_missing_scores():
+    partial = {"global_brand_score": 5, "growth_potential_score": "n/a", "reasoning": "ok"}
+    assert SCHEMA.repair(partial) is None
+    assert SCHEMA.repair(partial, fill_missing=True) == {"global_brand_score": 5, "growth_potential_score": 3,
+                                                         "management_score": 0, "reasoning": "ok"}
+    assert SCHEMA.repair({"global_brand_score": True, "growth_potential_score": 3, "management_score": 0}) is None
+    assert SCHEMA.repair(["not", "an", "object"]) is None
+
+
+def test_schema_limits():
+    assert SCHEMA.max_total() == 25
+    schema = SCHEMA.response_schema(key_field="ticker", array=True)
+    assert schema["type"] == "ARRAY"
+    assert schema["items"]["required"] == ["ticker", "global_brand_score", "growth_potential_score", "management_score"]
+    assert schema["items"]["properties"]["growth_potential_score"] == {"type": "INTEGER", "minimum": 3, "maximum": 10}
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,128 @@
+import sys
+import os
+import json
+import tempfile
+import pandas as pd
+
+# Add current directory to path
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from common_modules.llm.results import LLMResult
+from common_modules.screening.checkpoint import ScreeningCheckpoint
+from undervalued_bluechip_stocks.src.screener_bluechip import BluechipScreener
+
+
+class StubMarket:
+    use_mock = False
+
+    def __init__(self, fundamentals):
+        self.fundamentals = fundamentals
+
+    def get_fundamental_frame(self, tickers, date=None):
+        return self.fundamentals.reindex(tickers)
+
+    def get_fundamental(self, ticker, date=None):
+        return self.fundamentals.loc[ticker].rename(str.upper)
+
+    def get_market_caps(self, tickers, date=None):
+        return pd.Series({t: 1.0 for t in tickers})
+
+    def get_stock_name(self, ticker):
+        return "Company " + ticker
+
+
+class StubDart:
+    def find_corp_code(self, name):
+        return "C" + name[-6:]
+
+    def get_operating_income_history(self, corp_code, years):
+        return {year: 100.0 for year in years}
+
+    def get_major_shareholders(self, corp_code):
+        return pd.DataFrame()
+
+    def get_corp_listing(self):
+        return pd.DataFrame(columns=["corp_code", "corp_name", "stock_code"])
+
+
+class StubLLM:
+    """Scores every company the same; counts the prompts it is sent."""
+    max_concurrency = 2
+
+    def __init__(self):
+        self.prompts = []
+
+    def model_for(self, task=None):
+        return task or "default"
+
+    def generate_many(self, prompts, params=None, task=None, prefix=None):
+        self.prompts.extend(prompts)
+        answer = {"global_brand_score": 5, "growth_potential_score": 10, "management_score": 10, "reasoning": "stub"}
+        return [LLMResult(json.dumps(answer), model_id=self.model_for(task)) for _ in prompts]
+
+
+def make_screener(llm):
+    # PER 4 / PBR 0.2: 25 quant points, Grade A with the stub's scores
+    tickers = [f"{i:06d}" for i in range(1, 7)]
+    fundamentals = pd.DataFrame({"per": 4.0, "pbr": 0.2, "bps": 1.0, "eps": 1.0}, index=tickers)
+    screener = BluechipScreener(StubDart(), StubMarket(fundamentals), llm, batch_size=1, tiering=False)
+    return screener, tickers
+
+
+def test_checkpoint_round_trip():
+    path = os.path.join(tempfile.mkdtemp(), "checkpoint.json")
+    checkpoint = ScreeningCheckpoint(path, every=2)
+    checkpoint.record("quant", "000001", {"passed": True})
+    assert not os.path.exists(path)
+    checkpoint.record("llm", "000001", {"grade": "A"})
+    assert os.path.exists(path)
+    checkpoint.record("llm", "000002", None)
+    checkpoint.flush()
+
+    resumed = ScreeningCheckpoint(path, resume=True)
+    assert resumed.get("llm", "000001") == {"grade": "A"}
+    assert resumed.has("llm", "000002") and resumed.get("llm", "000002") is None
+    assert not resumed.has("llm", "000003")
+    # Without --resume the file is ignored
+    assert ScreeningCheckpoint(path).sections == {}
+
+    resumed.complete()
+    assert not os.path.exists(path)
+
+
+def test_corrupt_checkpoint_starts_fresh():
+    path = os.path.join(tempfile.mkdtemp(), "checkpoint.json")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"sections": {"llm": ')
+    assert ScreeningCheckpoint(path, resume=True).sections == {}
+
+
+def test_resume_skips_finished_tickers():
+    path = os.path.join(tempfile.mkdtemp(), "checkpoint.json")
+    llm = StubLLM()
+    screener, tickers = make_screener(llm)
+    candidates, all_results, _ = screener.run_screening(tickers, checkpoint=ScreeningCheckpoint(path, every=1))
+    assert len(candidates) == len(tickers) and len(llm.prompts) == len(tickers)
+
+    # Interrupted after half of the LLM stage: the resumed run only sends the other half
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    for ticker in tickers[3:]:
+        del data["sections"]["llm"][ticker]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+    llm = StubLLM()
+    screener, _ = make_screener(llm)
+    resumed, all_resumed, _ = screener.run_screening(tickers, checkpoint=ScreeningCheckpoint(path, resume=True))
+    assert len(llm.prompts) == 3
+    assert all(ticker in prompt for ticker, prompt in zip(tickers[3:], llm.prompts))
+    assert sorted(r["ticker"] for r in all_resumed) == tickers
+    assert [r["total_score"] for r in all_resumed] == [r["total_score"] for r in all_results]
+
+
+if __name__ == "__main__":
+    test_checkpoint_round_trip()
+    test_corrupt_checkpoint_starts_fresh()
+    test_resume_skips_finished_tickers()
+    print("SUCCESS")
@@ -0,0 +1,110 @@
+import sys
+import os
+import json
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Add current directory to path
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+sys.path.append(os.path.join(os.path.abspath(os.path.dirname(__file__)), "deep_value_asset_stocks"))
+
+from common_modules.screening.rules import Ladder, RuleSet, load_rules
+from undervalued_bluechip_stocks.src.screener_bluechip import BluechipScreener
+from undervalued_bluechip_stocks.src.local_scores import listed_shareholders, shareholder_stakes
+from src.logic.screener import Screener
+
+
+def baseline_quant(per, pbr):
+    """The if/elif quant check and scores of BluechipScreener before the rule DSL."""
+    if per < 5: score_per = 20
+    elif per < 8: score_per = 15
+    elif per < 10: score_per = 10
+    else: score_per = 5
+    if pbr < 0.3: score_pbr = 5
+    elif pbr < 0.6: score_pbr = 4
+    elif pbr <= 1.0: score_pbr = 3
+    else: score_pbr = 0
+    return (0 < per < 20 and 0 < pbr < 1.5), score_per, score_pbr
+
+
+# Grid around every threshold of the default rules, boundaries included
+PERS = [-1, 0, 0.1, 4.99, 5, 7.99, 8, 9.99, 10, 19.99, 20, 35]
+PBRS = [-0.1, 0, 0.1, 0.29, 0.3, 0.59, 0.6, 0.99, 1.0, 1.01, 1.49, 1.5, 3]
+
+
+def test_bluechip_ladders_match_baseline_vectorized():
+    frame = pd.DataFrame([{"per": per, "pbr": pbr} for per in PERS for pbr in PBRS])
+    result = BluechipScreener.RULES.evaluate(frame)
+    for i, row in frame.iterrows():
+        passed, score_per, score_pbr = baseline_quant(row.per, row.pbr)
+        assert (result.loc[i, "passed"], result.loc[i, "score_per"], result.loc[i, "score_pbr"]) == \
+            (passed, score_per, score_pbr), row.to_dict()
+
+
+def test_bluechip_single_ticker_matches_baseline():
+    rules = BluechipScreener.RULES
+    for per in PERS:
+        for pbr in PBRS:
+            passed, score_per, score_pbr = baseline_quant(per, pbr)
+            assert rules.check("quant", per=per, pbr=pbr) == passed
+            assert rules.score(per=per, pbr=pbr) == {"score_per": score_per, "score_pbr": score_pbr}
+
+
+def test_deep_value_filters_match_baseline():
+    rules = Screener.RULES
+    for pbr in PBRS:
+        assert rules.check("pbr", pbr=pbr) == (pbr <= 0.6)
+    for ratio in [0.0, 0.29, 0.3, 0.31, 1.0]:
+        assert rules.check("cash", cash_ratio=ratio) == (ratio >= 0.3)
+    for stake in [0.0, 29.99, 30.0, 55.5]:
+        assert rules.check("shareholder", shareholder_stake=stake) == (stake >= 30.0)
+    for income in [-5, 0, 1]:
+        assert rules.check("profit", min_op_income=income) == (income > 0)
+
+
+def test_missing_and_string_features():
+    frame = pd.DataFrame({"per": ["1,234", "-", None, "7.5"], "pbr": [0.4, 0.4, 0.4, "0.4"]})
+    result = BluechipScreener.RULES.evaluate(frame)
+    # Missing features never pass a filter; a ladder without a match gets its default
+    assert result["passed"].tolist() == [False, False, False, True]
+    assert result["score_per"].tolist() == [5, 5, 5, 15]
+
+
+def test_ladder_first_match_wins():
+    ladder = Ladder([("x > 1", 1), ("x > 0", 2)], default=-1)
+    scores = ladder.evaluate(pd.DataFrame({"x": [2, 0.5, 0, np.nan]}))
+    assert scores.tolist() == [1, 2, -1, -1]
+
+
+def test_load_rules_round_trip():
+    config = BluechipScreener.RULES.to_dict()
+    path = os.path.join(tempfile.mkdtemp(), "rules.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f)
+    rules = load_rules(path)
+    assert rules.to_dict() == config
+    assert rules.fingerprint() == BluechipScreener.RULES.fingerprint()
+    assert RuleSet.from_dict(dict(config, filters={"quant": "per < 10"})).fingerprint() != rules.fingerprint()
+
+
+def test_listed_shareholders_min_stake():
+    df = pd.DataFrame({"repror": ["(주)모회사", "소액지주", "모회사", "개인"], "stkrt": ["18.5", "5.0", "31.2", "-"]})
+    stakes = shareholder_stakes(df)
+    assert stakes == {"(주)모회사": 18.5, "소액지주": 5.0, "모회사": 31.2}
+    listed = {"모회사": "000001", "소액지주": "000002", "자회사": "000003"}
+    # The same 20% threshold as the ownership graph; the larger of repeated reports counts
+    assert listed_shareholders("자회사", stakes, listed) == {"모회사": 31.2}
+    assert listed_shareholders("자회사", {"소액지주": 19.99}, listed) == {}
+    assert listed_shareholders("모회사", stakes, listed) == {}
+
+
+if __name__ == "__main__":
+    test_bluechip_ladders_match_baseline_vectorized()
+    test_bluechip_single_ticker_matches_baseline()
+    test_deep_value_filters_match_baseline()
+    test_missing_and_string_features()
+    test_ladder_first_match_wins()
+    test_load_rules_round_trip()
+    test_listed_shareholders_min_stake()
+    print("SUCCESS")
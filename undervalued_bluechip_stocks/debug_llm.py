@@ -10,9 +10,10 @@ def test_llm():
     print("Initializing LLMClient...")
     llm = LLMClient()
     
-    if not llm.client:
-        print("ERROR: LLMClient failed to initialize (client is None). Check .env and API Key.")
+    if not llm.backend:
+        print("ERROR: LLMClient failed to initialize (no backend). Check .env and API Key, or set LLM_BACKEND=fake.")
         return
+    print(f"Backend: {llm.backend.name}")
 
     print(f"API Key loaded? {bool(llm.api_key)}")
     if llm.api_key:
@@ -21,7 +22,11 @@ def test_llm():
     print("Testing generation...")
     try:
         response = llm.generate_text("Hello, are you working? Reply with 'Yes'.")
+        if not response.ok:
+            print(f"ERROR calling generate_text: {response}")
+            return
         print(f"Response: {response}")
+        print(f"Metrics: {llm.metrics.summary()}")
     except Exception as e:
         print(f"ERROR calling generate_text: {e}")
 
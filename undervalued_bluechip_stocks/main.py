@@ -1,5 +1,6 @@
 import sys
 import os
+import argparse
 import pandas as pd
 from datetime import datetime
 
@@ -8,8 +9,14 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from common_modules.data.dart_fetcher import DartFetcher
 from common_modules.data.market_fetcher import MarketDataFetcher
+from common_modules.data.ownership_graph import OwnershipGraph
+from common_modules.data.run_cache import RunCache, CachedFetcher
 from common_modules.llm.llm_client import LLMClient
+from common_modules.llm.scheduler import LLMBudget
 from common_modules.notification.telegram_bot import TelegramNotifier
+from common_modules.screening.checkpoint import ScreeningCheckpoint
+from common_modules.screening.result_store import ResultStore
+from common_modules.screening.rules import load_rules
 from undervalued_bluechip_stocks.src.screener_bluechip import BluechipScreener
 
 def save_results_to_csv(results, filename="bluechip_results.csv"):
@@ -19,8 +26,25 @@ def save_results_to_csv(results, filename="bluechip_results.csv"):
     print(f"Results saved to {filename}")
     return filename
 
-def main():
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+CHECKPOINT_PATH = os.path.join(CACHE_DIR, "checkpoint.json")
+RESULT_STORE_PATH = os.path.join(CACHE_DIR, "results.json")
+METRICS_PATH = os.path.join(CACHE_DIR, "llm_metrics.json")
+OWNERSHIP_GRAPH_PATH = os.path.join(CACHE_DIR, "ownership_graph.json")
+
+def main(resume=False, full=False, rules_path=None, batch_size=5, bypass_llm_cache=False,
+         max_llm_calls=None, max_llm_tokens=None, max_llm_seconds=None, stop_after=None, tiering=True, escalation_margin=None,
+         vote_samples=1, vote_margin=None, batch_job=False, ownership_graph=True,
+         build_ownership_graph=False, target_grade="B"):
     print(">>> Undervalued Bluechip Stock Bot Started")
+    checkpoint = ScreeningCheckpoint(CHECKPOINT_PATH, resume=resume)
+    # Per-ticker results of previous runs - only companies whose inputs changed are re-evaluated
+    result_store = ResultStore(RESULT_STORE_PATH, full=full)
+    # Screening rules from a config file, or the screener's built-in defaults
+    rules = load_rules(rules_path) if rules_path else None
+    # LLM budget of this run (flags, then LLM_BUDGET_* env, then the screener's default call cap)
+    budget = LLMBudget.from_env(max_llm_calls, max_llm_tokens, max_llm_seconds,
+                                default_calls=BluechipScreener.DEFAULT_LLM_CALLS)
     
     # 1. Initialize Modules
     dart_key = os.getenv("DART_API_KEY")
@@ -30,16 +54,21 @@ def main():
         use_mock = True
         dart_key = "MOCK"
         
-    dart = DartFetcher(api_key=dart_key)
+    # Memoize identical fetcher calls for the lifetime of this run
+    run_cache = RunCache()
+    dart = CachedFetcher(DartFetcher(api_key=dart_key), run_cache)
     
     # If DART falls back to Mock, force Market to Mock
     if dart.api_key == "MOCK" and not use_mock:
         use_mock = True
     
-    market = MarketDataFetcher(use_mock=use_mock)
-    llm = LLMClient()
+    market = CachedFetcher(MarketDataFetcher(use_mock=use_mock), run_cache)
+    llm = LLMClient(bypass_cache=bypass_llm_cache)
     notifier = TelegramNotifier()
-    screener = BluechipScreener(dart, market, llm)
+    screener = BluechipScreener(dart, market, llm, result_store=result_store, rules=rules, batch_size=batch_size, budget=budget,
+                                stop_after=stop_after, tiering=tiering, escalation_margin=escalation_margin,
+                                vote_samples=vote_samples, vote_margin=vote_margin, batch_job=batch_job,
+                                target_grade=target_grade)
     
     # 2. Screening
     tickers = market.get_all_stocks()
@@ -51,12 +80,29 @@ def main():
         use_mock = True
         dart.api_key = "MOCK"
         dart.load_mock_data()
-        market = MarketDataFetcher(use_mock=True)
-        screener = BluechipScreener(dart, market, llm)
+        run_cache.clear()
+        market = CachedFetcher(MarketDataFetcher(use_mock=True), run_cache)
+        screener = BluechipScreener(dart, market, llm, result_store=result_store, rules=rules, batch_size=batch_size, budget=budget,
+                                    stop_after=stop_after, tiering=tiering, escalation_margin=escalation_margin,
+                                    vote_samples=vote_samples, vote_margin=vote_margin, batch_job=batch_job,
+                                    target_grade=target_grade)
         tickers = market.get_all_stocks()
     
+    # Listed parents / subsidiaries for the duplicate listing rule. The full build reads every listed
+    # company from DART (2-4 requests each), so it only runs with --build-ownership-graph; a built
+    # graph is then refreshed from the disclosures filed since the previous run.
+    if ownership_graph:
+        ownership = OwnershipGraph(OWNERSHIP_GRAPH_PATH)
+        ownership.update(dart, tickers, build=build_ownership_graph)
+        if ownership.is_current():
+            ownership.save()
+            screener.ownership = ownership
+        else:
+            print("Matching listed parents from major shareholders (--build-ownership-graph builds the ownership graph).")
+    
     # Run Screener
-    candidates, all_results, stats = screener.run_screening(tickers)
+    candidates, all_results, stats = screener.run_screening(tickers, checkpoint=checkpoint)
+    print(f"Fetch cache: {run_cache.stats()}")
     
     if not all_results:
         print("No candidates found. Proceeding to report empty results.")
@@ -76,6 +122,10 @@ def main():
     formatted_candidates = []
     
     
+    # "Grade B+" = the target grade or better
+    target_label = target_grade if target_grade == "A" else f"{target_grade}+"
+    candidate_tickers = {c['ticker'] for c in candidates}
+    
     # Sort all results by Total Score descending
     all_results.sort(key=lambda x: x['total_score'], reverse=True)
     
@@ -97,19 +147,25 @@ def main():
         report_section += f"- **Stats**: PER {details['per']}, PBR {details['pbr']}\n"
         report_section += f"- **Scores**: PER+PBR (Quant) {c['score_per']+c['score_pbr']} + Qual {c['score_qual']}\n"
         report_section += f"- **Qual Breakdown**:\n\n"
-        report_section += f"| Criterion | Score |\n"
-        report_section += f"|---|---|\n"
-        report_section += f"| Duplicate Listing | {details['duplicate_listing']}pts |\n"
-        report_section += f"| Global Brand | {details['global_brand']}pts |\n"
-        report_section += f"| Profit Sustainability | {details['profit_sustainability']}pts |\n"
-        report_section += f"| Future Growth | {details['growth_potential']}pts |\n"
-        report_section += f"| Management | {details['management']}pts |\n"
+        # Duplicate listing and profit sustainability are rule-based (DART data), the rest come from the LLM
+        rule_based = details.get('rule_based', {})
+        report_section += f"| Criterion | Score | Basis |\n"
+        report_section += f"|---|---|---|\n"
+        report_section += f"| Duplicate Listing | {details['duplicate_listing']}pts | {rule_based.get('duplicate_listing', 'LLM')} |\n"
+        report_section += f"| Global Brand | {details['global_brand']}pts | LLM |\n"
+        report_section += f"| Profit Sustainability | {details['profit_sustainability']}pts | {rule_based.get('profit_sustainability', 'LLM')} |\n"
+        report_section += f"| Future Growth | {details['growth_potential']}pts | LLM |\n"
+        report_section += f"| Management | {details['management']}pts | LLM |\n"
+        vote = c.get('vote')
+        if vote:
+            report_section += (f"- **Vote**: {len(vote['totals'])} samples, totals {' / '.join(str(t) for t in vote['totals'])} "
+                               f"(grades {' / '.join(vote['grades'])}, spread {vote['spread']}pts) -> median {c['total_score']}pts\n")
         report_section += f"\n**LLM Reasoning**:\n{reasoning}\n"
         
         llm_reports.append(report_section)
         
-        # Candidate table data - ONLY for Top Candidates (Grade A/B)
-        if c['grade'] in ['A', 'B']:
+        # Candidate table data - ONLY for Top Candidates (target grade or better)
+        if c['ticker'] in candidate_tickers:
             formatted_candidates.append({
                 "ticker": c['ticker'],
                 "name": c['name'],
@@ -137,9 +193,23 @@ def main():
     full_report += "|---|---|---|\n"
     full_report += f"| Total Scanned | {scanned} | 100% |\n"
     full_report += f"| Passed Quant (PER<20, PBR<1.5) | {passed_quant} | {calc_rate(passed_quant, scanned)}% |\n"
+    if stats.get('pruned_upper_bound'):
+        full_report += f"| Pruned (Cannot Reach Grade {target_grade}) | {stats['pruned_upper_bound']} | - |\n"
     if analyzed_llm != passed_quant:
         full_report += f"| Selected for LLM (Sampled) | {analyzed_llm} | - |\n"
-    full_report += f"| **Final Candidates** (Grade B+) | **{passed_final}** | {calc_rate(passed_final, analyzed_llm)}% |\n\n"
+    skipped_llm = stats.get('skipped_llm', [])
+    if skipped_llm:
+        full_report += f"| Skipped (LLM Budget) | {len(skipped_llm)} | - |\n"
+    if stats.get('stopped_early'):
+        full_report += f"| Not Analyzed (Stopped After {stop_after} Candidates) | {stats['stopped_early']} | - |\n"
+    routing = stats.get('routing')
+    if routing:
+        full_report += f"| Triaged ({llm.model_for('triage')}) | {routing['triaged']} | - |\n"
+        full_report += f"| Escalated ({llm.model_for('final')}) | {routing['escalated']} | {calc_rate(routing['escalated'], routing['triaged'])}% |\n"
+    voting = stats.get('voting')
+    if voting:
+        full_report += f"| Voted (Borderline, {vote_samples} Samples) | {voting['voted']} | Grade changed: {voting['changed']} |\n"
+    full_report += f"| **Final Candidates** (Grade {target_label}) | **{passed_final}** | {calc_rate(passed_final, analyzed_llm)}% |\n\n"
     
     full_report += "## 2. Selected for LLM List\n"
     full_report += "| Ticker | Name | Grade | Quant Score (PER+PBR) | PER | PBR | Reason by LLM |\n"
@@ -152,6 +222,9 @@ def main():
     
     full_report += "\n"
     
+    if skipped_llm:
+        full_report += f"LLM budget reached ({stats['llm_budget']['calls']} calls). Skipped: {', '.join(skipped_llm)}\n"
+    
     full_report += "\n"
     
     full_report += "\n## 3. Detailed Analysis\n\n"
@@ -159,6 +232,9 @@ def main():
         full_report += "No candidates found to analyze.\n"
     for report in llm_reports:
         full_report += report + "\n---\n\n"
+    
+    full_report += llm.metrics.markdown_table()
+    llm.metrics.save(METRICS_PATH)
 
     # 4.Publish to Wiki
     from common_modules.publishing.wiki_publisher import WikiPublisher
@@ -179,7 +255,51 @@ def main():
     notifier.send_message(summary)
 
     save_results_to_csv(candidates)
+    checkpoint.complete()
+    print(f"LLM response cache: {llm.cache_stats()}")
+    if 'llm_budget' in stats:
+        print(f"LLM budget: {stats['llm_budget']}")
+    if 'routing' in stats:
+        print(f"LLM routing: {stats['routing']}")
+    if 'voting' in stats:
+        print(f"Grade voting: {stats['voting']}")
+    # Wait for the queued Telegram messages, bounded so a Telegram outage cannot hang the job
+    if not notifier.flush(timeout=120):
+        print("Telegram notifications still pending after 120s, giving up on them.")
     print(">>> Job Completed.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Undervalued Bluechip Stock Bot")
+    parser.add_argument("--resume", action="store_true", help="Resume an interrupted run from its checkpoint, skipping completed tickers")
+    parser.add_argument("--full", action="store_true", help="Re-evaluate every company, ignoring results stored by previous runs")
+    parser.add_argument("--rules", help="JSON/YAML file with screening rules (filters and score ladders)")
+    parser.add_argument("--batch-size", type=int, default=5, help="Companies scored per LLM request (1 = one request per company)")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Always call the LLM, ignoring cached responses")
+    parser.add_argument("--max-llm-calls", type=int, help=f"LLM request budget of the run (default {BluechipScreener.DEFAULT_LLM_CALLS} requests; "
+                             f"each scores up to --batch-size companies, so up to {BluechipScreener.DEFAULT_LLM_CALLS} x batch size companies)")
+    parser.add_argument("--max-llm-tokens", type=int, help="Estimated LLM token budget of the run")
+    parser.add_argument("--max-llm-seconds", type=float, help="Wall-time budget for LLM analysis, in seconds")
+    parser.add_argument("--stop-after", type=int, help="Stop LLM analysis once this many candidates (target grade or better) are found")
+    parser.add_argument("--target-grade", choices=["A", "B", "C"], default="B",
+                        help="Lowest grade that makes a candidate (default B)")
+    parser.add_argument("--no-tiering", action="store_true", help="Score every company with the main model (no cheap triage pass)")
+    parser.add_argument("--escalation-margin", type=int,
+                        help=f"Re-score triage results within this many points of Grade B with the main model (default {BluechipScreener.ESCALATION_MARGIN})")
+    parser.add_argument("--vote-samples", type=int, default=1,
+                        help="Samples per borderline company, graded by their median (default 1 = no voting)")
+    parser.add_argument("--vote-margin", type=int,
+                        help=f"Totals within this many points of a grade threshold are voted on (default {BluechipScreener.VOTE_MARGIN})")
+    parser.add_argument("--batch-job", action="store_true",
+                        help="Score through LLM batch jobs (batch pricing, results may take hours; re-run to resume)")
+    parser.add_argument("--no-ownership-graph", action="store_true",
+                        help="Detect listed parents from major shareholders only (no DART ownership graph)")
+    parser.add_argument("--build-ownership-graph", action="store_true",
+                        help="Build the DART ownership graph if it is missing or older than "
+                             f"{OwnershipGraph.REFRESH_MAX_DAYS} days (2-4 DART requests per listed company)")
+    args = parser.parse_args()
+    main(resume=args.resume, full=args.full, rules_path=args.rules, batch_size=args.batch_size, bypass_llm_cache=args.no_llm_cache,
+         max_llm_calls=args.max_llm_calls, max_llm_tokens=args.max_llm_tokens, max_llm_seconds=args.max_llm_seconds,
+         stop_after=args.stop_after, tiering=not args.no_tiering, escalation_margin=args.escalation_margin,
+         vote_samples=args.vote_samples, vote_margin=args.vote_margin, batch_job=args.batch_job,
+         ownership_graph=not args.no_ownership_graph, build_ownership_graph=args.build_ownership_graph,
+         target_grade=args.target_grade)
@@ -0,0 +1,88 @@
+import re
+import statistics
+from common_modules.data.ownership_graph import OwnershipGraph, normalize_name, parse_percent
+
+# Rule-based scores for the rubric items that follow from DART data, so the LLM does not
+# have to guess them. Each returns (score, reason).
+
+# Profit sustainability: years of history needed, max volatility (stdev / mean) and the share of
+# the average the latest year must keep for the trend to count as stable
+MIN_PROFIT_YEARS = 3
+MAX_PROFIT_VOLATILITY = 0.5
+MIN_LATEST_PROFIT_SHARE = 0.5
+
+# Holding company names (the rubric scores holding companies as duplicate listings)
+HOLDING_COMPANY = re.compile(r"홀딩스|지주|holdings", re.IGNORECASE)
+
+
+def profit_sustainability(history):
+    """
+    history: {year: operating income or None}. 5 points for consistent profits with a stable trend,
+    0 for deficits, high volatility, a declining trend or too little data.
+    """
+    amounts = [history[year] for year in sorted(history) if history[year] is not None]
+    if len(amounts) < MIN_PROFIT_YEARS:
+        return 0, f"Only {len(amounts)} years of operating income on DART"
+    deficits = sum(1 for amount in amounts if amount <= 0)
+    if deficits:
+        return 0, f"Operating deficit in {deficits} of {len(amounts)} years"
+    mean = statistics.mean(amounts)
+    volatility = statistics.pstdev(amounts) / mean
+    if volatility > MAX_PROFIT_VOLATILITY:
+        return 0, f"Volatile operating income (stdev {volatility:.0%} of mean)"
+    if amounts[-1] < mean * MIN_LATEST_PROFIT_SHARE:
+        return 0, f"Declining: latest operating income {amounts[-1] / mean:.0%} of the {len(amounts)}-year mean"
+    return 5, f"Profitable in all {len(amounts)} years, stable (stdev {volatility:.0%} of mean)"
+
+
+def duplicate_listing(corp_name, parents, children):
+    """
+    5 points for a single listing, 0 for a holding company or a company with a listed parent or a
+    listed subsidiary. parents / children: {listed company name: stake % or None}.
+    """
+    if HOLDING_COMPANY.search(corp_name or ""):
+        return 0, "Holding company"
+    if parents:
+        return 0, f"Listed parent: {_stakes(parents)}"
+    if children:
+        return 0, f"Listed subsidiary: {_stakes(children)}"
+    return 5, "No listed parent or subsidiary"
+
+
+def listed_shareholders(corp_name, stakes, listed_names, min_pct=OwnershipGraph.DEFAULT_MIN_PCT):
+    """
+    Fallback without an ownership graph: {name: stake %} of the major shareholders that are listed
+    themselves and hold at least min_pct, the ownership graph's threshold. stakes: {shareholder name: %}
+    (see shareholder_stakes), listed_names: {company name: ticker}.
+    """
+    listed = {normalize_name(name): name for name in listed_names if normalize_name(name) != normalize_name(corp_name)}
+    related = {}
+    for name, pct in stakes.items():
+        key = normalize_name(name)
+        if key in listed and pct >= min_pct:
+            related[listed[key]] = max(pct, related.get(listed[key], 0.0))
+    return related
+
+
+def shareholder_stakes(df):
+    """
+    {shareholder name: largest stake %} of a DART major shareholders table (reporter "repror" or "nm",
+    stake "stkrt" or "trmend_posesn_stock_qota_rt"; mock: "stock_name", "stock_qota"). Rows without a
+    readable stake are left out, as in the ownership graph.
+    """
+    if df is None or df.empty:
+        return {}
+    name_col = next((c for c in ("repror", "nm", "stock_name") if c in df.columns), None)
+    pct_col = next((c for c in ("stkrt", "trmend_posesn_stock_qota_rt", "stock_qota") if c in df.columns), None)
+    if name_col is None or pct_col is None:
+        return {}
+    stakes = {}
+    for name, pct in zip(df[name_col], df[pct_col]):
+        pct = parse_percent(pct)
+        if name == name and name is not None and pct is not None:
+            stakes[str(name)] = max(pct, stakes.get(str(name), 0.0))
+    return stakes
+
+
+def _stakes(related):
+    return ", ".join(name if pct is None else f"{name} ({pct:g}%)" for name, pct in sorted(related.items()))
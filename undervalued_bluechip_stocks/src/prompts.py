@@ -1,64 +1,52 @@
-BLUECHIP_SCORING_PROMPT = """
+# Scoring rubric shared by the single and the batch scoring prompts. Duplicate listing and profit
+# sustainability are scored locally from DART data (see local_scores), not by the LLM.
+BLUECHIP_RUBRIC = """
+## Scoring Criteria (Qual, 25 Points)
+1. global_brand_score (0/5): 5 = brand or product with global recognition and competitiveness (export-driven). 0 = domestic focused or commodity player.
+2. growth_potential_score (3/5/7/10): industry growth and the company's position. 10 = leader in a high-growth industry (AI, Bio, Batteries). 7 = growing industry. 5 = mature, stable industry. 3 = declining industry.
+3. management_score (0/5/10): reputation and track record of the management/owner. 10 = proven, shareholder friendly. 5 = standard professional management. 0 = embezzlement, poor governance or anti-shareholder actions.
+"""
+
+# Prompts are a static prefix (instructions, rubric, output format) followed by the per-company
+# part (LLMClient.generate_text(prefix=...)).
+BLUECHIP_SCORING_PREFIX = """
 You are a professional equity research analyst evaluating a company for a "Undervalued Bluechip" portfolio.
-Your goal is to evaluate the company based on qualitative factors and assign scores according to the strict criteria below.
+Your goal is to evaluate the company given at the end based on qualitative factors and assign scores according to the strict criteria below.
+""" + BLUECHIP_RUBRIC + """
+---
+
+## Output Format
+You MUST reply with a JSON object ONLY: the three scores above (by their key names) and "reasoning", a short analysis summary.
+Do not include any text outside the JSON.
+"""
 
+BLUECHIP_COMPANY_INFO = """
 ## Company Info
 - Name: {name}
 - Ticker: {ticker}
-- Financial Summary (Last 5 Years Operating Income): {profit_history}
 - PBR: {pbr}
 - PER: {per}
+"""
 
-## Evaluation Criteria & Scoring (Total 40 Points for Qual/Hybrid)
-
-### 1. Duplicate Listing Issue (5 Points)
-- **Criteria**: Is this company a holding company or a subsidiary where the parent/child is also listed on the Korean stock market (KOSPI/KOSDAQ)? (Double Counting Discount)
-- **Score 5**: Single listing (No significant overlap with listed parent/subsidiary).
-- **Score 0**: Duplicate listing (Holding company or subsidiary with listed parent).
-- **Output**: Score (0 or 5) and reasoning.
-
-### 2. Global Brand Power (5 Points)
-- **Criteria**: Does this company possess a brand or product with significant global recognition and competitiveness?
-- **Score 5**: Yes (Global presence, export-driven, recognizable brand).
-- **Score 0**: No (Domestic focused or commodity player without brand power).
-- **Output**: Score (0 or 5) and reasoning.
-
-### 3. Sustainability of Profits (5 Points)
-- **Criteria**: Look at the provided 5-year operating income history. Is the profit generation stable and sustainable?
-- **Score 5**: Sustainable (Consistent profits, no major deficits, stable trend).
-- **Score 0**: Unstable (Deficits, high volatility, declining trend).
-- **Output**: Score (0 or 5) and reasoning.
-
-### 4. Future Growth Potential (10 Points)
-- **Criteria**: Assess the industry growth and company's position.
-- **Score 10**: Very High (Leading high-growth industry like AI, Bio, Batteries).
-- **Score 7**: High (Growing industry).
-- **Score 5**: Medium (Mature industry, stable).
-- **Score 3**: Low (Declining industry).
-- **Output**: Score (3, 5, 7, 10) and reasoning.
-
-### 5. Management Quality (10 Points)
-- **Criteria**: Evaluate the reputation and track record of the management/owner.
-- **Score 10**: Excellent (Proven track record, shareholder friendly).
-- **Score 5**: Professional/Average (Standard professional management).
-- **Score 0**: Poor (History of embezzlement, poor governance, anti-shareholder actions).
-- **Output**: Score (0, 5, 10) and reasoning.
+BLUECHIP_SCORING_PROMPT = BLUECHIP_SCORING_PREFIX + BLUECHIP_COMPANY_INFO
 
+BLUECHIP_BATCH_SCORING_PREFIX = """
+You are a professional equity research analyst evaluating companies for a "Undervalued Bluechip" portfolio.
+Your goal is to evaluate EACH company listed at the end independently based on qualitative factors and assign scores according to the strict criteria below.
+""" + BLUECHIP_RUBRIC + """
 ---
 
 ## Output Format
-You MUST reply with a JSON object ONLY, containing the scores and a short analysis summary.
-
-Example:
-{{
-  "duplicate_listing_score": 5,
-  "global_brand_score": 0,
-  "profit_sustainability_score": 5,
-  "growth_potential_score": 7,
-  "management_score": 5,
-  "total_qual_score": 22,
-  "reasoning": "The company is a single listed entity with stable profits... (Short summary)"
-}}
-
+You MUST reply with a JSON array ONLY, with exactly one object per listed company: its "ticker", the three scores above (by their key names) and "reasoning", a short analysis summary.
 Do not include any text outside the JSON.
 """
+
+BLUECHIP_BATCH_COMPANIES = """
+## Companies
+{companies}
+"""
+
+BLUECHIP_BATCH_SCORING_PROMPT = BLUECHIP_BATCH_SCORING_PREFIX + BLUECHIP_BATCH_COMPANIES
+
+# One line per company in BLUECHIP_BATCH_COMPANIES
+BLUECHIP_BATCH_COMPANY_LINE = "- Ticker: {ticker} | Name: {name} | PBR: {pbr} | PER: {per}"
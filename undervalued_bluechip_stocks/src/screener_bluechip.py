@@ -1,15 +1,104 @@
-import json
-import re
-from .prompts import BLUECHIP_SCORING_PROMPT
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from common_modules.llm.prompt_builder import PromptBuilder
+from common_modules.llm.scheduler import BudgetScheduler, LLMBudget
+from common_modules.llm.structured import ScoreSchema, extract_json, json_config
+from common_modules.screening.result_store import fingerprint
+from common_modules.screening.rules import RuleSet
+from .local_scores import profit_sustainability, duplicate_listing, listed_shareholders, shareholder_stakes
+from .prompts import (BLUECHIP_SCORING_PROMPT, BLUECHIP_SCORING_PREFIX, BLUECHIP_COMPANY_INFO,
+                      BLUECHIP_BATCH_SCORING_PREFIX, BLUECHIP_BATCH_COMPANIES, BLUECHIP_BATCH_COMPANY_LINE)
 
 class BluechipScreener:
-    def __init__(self, dart_fetcher, market_fetcher, llm_client):
+    # Default quant rules: broad PER/PBR filter and the PER/PBR score ladders
+    RULES = RuleSet.from_dict({
+        "filters": {
+            "quant": "0 < per < 20 and 0 < pbr < 1.5"
+        },
+        "scores": {
+            "score_per": {"steps": [["per < 5", 20], ["per < 8", 15], ["per < 10", 10]], "default": 5},
+            "score_pbr": {"steps": [["pbr < 0.3", 5], ["pbr < 0.6", 4], ["pbr <= 1.0", 3]], "default": 0}
+        }
+    })
+
+    # Qualitative scores every LLM response must contain, with the values the rubric allows
+    SCORE_SCHEMA = ScoreSchema({
+        "global_brand_score": [0, 5],
+        "growth_potential_score": [3, 5, 7, 10],
+        "management_score": [0, 5, 10]
+    }, text_fields=("reasoning",))
+
+    # Qualitative scores computed locally from DART data (see local_scores), with their maximum
+    LOCAL_SCORES = {"duplicate_listing_score": 5, "profit_sustainability_score": 5}
+
+    # Operating income years behind the profit sustainability score
+    PROFIT_YEARS = [2020, 2021, 2022, 2023, 2024]
+
+    # LLM requests per run when no budget is given. A request scores up to batch_size companies, so
+    # this covers up to 20 x batch_size companies (the cap used to be 20 companies)
+    DEFAULT_LLM_CALLS = 20
+
+    # Minimum total score per grade, best first (see _build_result)
+    GRADE_THRESHOLDS = (("A", 54), ("B", 48), ("C", 30))
+
+    # Triage scores within this many points below the target grade threshold are re-scored by the final model
+    ESCALATION_MARGIN = 6
+
+    # Voting mode: totals within this many points of a grade threshold count as borderline
+    VOTE_MARGIN = 3
+
+    # Share of the LLM budget the first scoring pass leaves for the later passes (final scoring with
+    # tiering, votes), so cheap triage calls cannot starve them (see _budget_share)
+    RESERVED_BUDGET_SHARE = 0.3
+
+    def __init__(self, dart_fetcher, market_fetcher, llm_client, result_store=None, rules=None, batch_size=5, budget=None,
+                 target_grade="B", stop_after=None, tiering=True, escalation_margin=None, vote_samples=1, vote_margin=None,
+                 batch_job=False, ownership=None, max_workers=4):
         self.dart = dart_fetcher
         self.market = market_fetcher
         self.llm = llm_client
+        self.rules = rules or self.RULES
+        # Companies scored per LLM request (1 = one request per company)
+        self.batch_size = max(1, int(batch_size))
+        # Fundamentals frame of the current run (filled by screen_quant)
+        self._fundamentals = pd.DataFrame()
+        # Optional ResultStore: LLM evaluations of companies whose inputs did not change are reused
+        self.result_store = result_store
+        # Per-run LLM budget (calls / tokens / seconds), spent on the most promising companies first
+        self.budget = budget or LLMBudget(max_calls=self.DEFAULT_LLM_CALLS)
+        # Lowest grade that makes a candidate; companies that cannot reach it are not sent to the LLM
+        self.target_grade = target_grade
+        # Optional: stop sending work once this many candidates (target grade or better) are found
+        self.stop_after = stop_after
+        # Compact prompt rendering within the per-prompt token budget
+        self.single_prompt = PromptBuilder(BLUECHIP_COMPANY_INFO)
+        self.company_line = PromptBuilder(BLUECHIP_BATCH_COMPANY_LINE)
+        # Model tiering: the cheap "triage" model scores everyone, the default model re-scores
+        # the companies near or above the target grade
+        self.tiering = tiering
+        self.escalation_margin = self.ESCALATION_MARGIN if escalation_margin is None else escalation_margin
+        # Opt-in voting: borderline companies get vote_samples samples in total, graded by the median
+        self.vote_samples = max(1, int(vote_samples or 1))
+        self.vote_margin = self.VOTE_MARGIN if vote_margin is None else vote_margin
+        # Batch-job mode (nightly runs): each scoring pass goes out as one LLM batch job instead of
+        # concurrent interactive requests
+        self.batch_job = batch_job
+        # Optional OwnershipGraph: listed parents and subsidiaries for the duplicate listing rule.
+        # Without it, major shareholders are matched against the listed company names.
+        self.ownership = ownership
+        self._listed_names = None
+        # Tickers of the current run (the listed companies shareholders are matched against)
+        self._universe = None
+        # Companies whose DART data (rule-based scores) is fetched at once
+        self.max_workers = max(1, int(max_workers))
 
-    def run_screening(self, tickers):
+    def run_screening(self, tickers, checkpoint=None):
+        """
+        checkpoint: optional ScreeningCheckpoint. Quant and LLM outcomes are recorded to it,
+        and tickers it already holds (--resume) are not evaluated again.
+        """
         print(f"Starting Bluechip Screening for {len(tickers)} tickers...")
+        self._universe = set(tickers)
         candidates = []
         all_results = []
         stats = {
@@ -18,68 +107,143 @@ class BluechipScreener:
             "passed_final": 0
         }
 
-        # 1. Level 1: Quant Filter
-        quant_pass_tickers = []
-        for ticker in tickers:
-            passed, q_score, q_details = self._check_quant_and_score(ticker)
-            if passed:
-                quant_pass_tickers.append({
-                    "ticker": ticker,
-                    "quant_score": q_score,
-                    "details": q_details
-                })
-        
-        stats["passed_quant"] = len(quant_pass_tickers)
-        print(f"Passed Quant Filter: {len(quant_pass_tickers)} companies")
+        try:
+            # 1. Level 1: Quant Filter - evaluated over the whole universe in one vectorized pass
+            todo = [t for t in tickers if not (checkpoint and checkpoint.has("quant", t))]
+            quant_stage = self.screen_quant(todo)
             
-        # 2. Level 2: Qual Analysis via LLM
-        # Limit to top 5 for testing/mock if list is huge
-        if len(quant_pass_tickers) > 5 and self.market.use_mock:
-             print("Mock Mode: Limiting to top 5 by score for speed.")
-             quant_pass_tickers.sort(key=lambda x: x['quant_score'], reverse=True)
-             quant_pass_tickers = quant_pass_tickers[:5]
-        
-        # Real mode limit to avoid huge API costs if too many pass? 
-        # For now, let's process max 20.
-        if len(quant_pass_tickers) > 20:
-            print("Sort by Quant Score (PER+PBR) and limit to top 20.")
-            # Sort by total_score descending
-            quant_pass_tickers.sort(key=lambda x: x['quant_score'], reverse=True)
-            quant_pass_tickers = quant_pass_tickers[:20]
-        
-        stats["analyzed_llm"] = len(quant_pass_tickers)
-
-        for candidate in quant_pass_tickers:
-            ticker = candidate['ticker']
-            pre_calc_score = candidate['quant_score']
-            pre_calc_details = candidate['details']
+            quant_pass_tickers = []
+            for ticker in tickers:
+                saved = checkpoint.get("quant", ticker) if checkpoint else None
+                if saved is not None:
+                    passed, q_score, q_details = saved["passed"], saved["score"], saved["details"]
+                else:
+                    passed, q_score, q_details = quant_stage[ticker]
+                    if checkpoint:
+                        checkpoint.record("quant", ticker, {"passed": passed, "score": q_score, "details": q_details})
+                if passed:
+                    quant_pass_tickers.append({
+                        "ticker": ticker,
+                        "quant_score": q_score,
+                        "details": q_details
+                    })
             
-            result = self.evaluate_company(ticker, pre_calc_score, pre_calc_details)
-            if result:
-                print(f"  -> {result['name']}: Total Score {result['total_score']} (Grade {result['grade']})")
-                all_results.append(result)
-                if result['grade'] in ['A', 'B']:
-                    candidates.append(result)
+            stats["passed_quant"] = len(quant_pass_tickers)
+            print(f"Passed Quant Filter: {len(quant_pass_tickers)} companies")
+            
+            # Upper-bound pruning: skip companies that stay below the target grade even with
+            # the maximum qualitative score (e.g. PER 5 + PBR 0 + Qual 35 = 40 < 48 for B)
+            max_qual = self.SCORE_SCHEMA.max_total() + sum(self.LOCAL_SCORES.values())
+            target_score = self._grade_threshold(self.target_grade)
+            reachable = [c for c in quant_pass_tickers if c['quant_score'] + max_qual >= target_score]
+            stats["pruned_upper_bound"] = len(quant_pass_tickers) - len(reachable)
+            if stats["pruned_upper_bound"]:
+                print(f"Pruned {stats['pruned_upper_bound']} companies that cannot reach Grade {self.target_grade} (max qual {max_qual}).")
+            quant_pass_tickers = reachable
+                
+            # 2. Level 2: Qual Analysis via LLM
+            # Spend the LLM budget in order of expected value: quant score (PER+PBR), then market cap
+            scheduler = BudgetScheduler(self.budget)
+            caps = self.market.get_market_caps([c['ticker'] for c in quant_pass_tickers])
+            for c in quant_pass_tickers:
+                cap = caps.get(c['ticker'])
+                c['market_cap'] = 0 if pd.isna(cap) else cap
+            quant_pass_tickers = scheduler.prioritize(quant_pass_tickers, key=lambda x: (x['quant_score'], x['market_cap']))
+            
+            # Limit to top 5 for testing/mock if list is huge
+            if len(quant_pass_tickers) > 5 and self.market.use_mock:
+                 print("Mock Mode: Limiting to top 5 by score for speed.")
+                 quant_pass_tickers = quant_pass_tickers[:5]
+
+            def record(ticker, result):
+                # Failed evaluations are not recorded, so a resumed run retries them
+                if checkpoint:
+                    checkpoint.record("llm", ticker, result)
+            
+            todo = [c for c in quant_pass_tickers if not (checkpoint and checkpoint.has("llm", c['ticker']))]
+            stop_after = None
+            if self.stop_after is not None:
+                # Candidates already found by an interrupted run count too
+                found = sum(1 for c in quant_pass_tickers
+                            if checkpoint and self._is_candidate(checkpoint.get("llm", c['ticker'])))
+                stop_after = max(0, self.stop_after - found)
+            evaluated = self.evaluate_companies(todo, on_result=record, scheduler=scheduler, stop_after=stop_after)
+            # Companies the local scores ruled out never reach the LLM
+            stats["pruned_upper_bound"] += len(self.pruned_local)
+            quant_pass_tickers = [c for c in quant_pass_tickers if c['ticker'] not in self.pruned_local]
+            todo = [c for c in todo if c['ticker'] not in self.pruned_local]
+            
+            budget = scheduler.summary()
+            # Escalations skipped by the budget keep their triage result, so only unscored companies count
+            skipped = [t for t in budget["skipped"] if t not in evaluated]
+            if skipped:
+                print(f"LLM budget reached: skipped {len(skipped)} lower-priority companies.")
+            stopped = [c['ticker'] for c in todo if c['ticker'] not in evaluated and c['ticker'] not in skipped]
+            if stopped:
+                print(f"Found {self.stop_after} candidates: {len(stopped)} lower-priority companies not analyzed.")
+            stats["analyzed_llm"] = len(quant_pass_tickers) - len(skipped) - len(stopped)
+            stats["skipped_llm"] = skipped
+            stats["stopped_early"] = len(stopped)
+            stats["llm_budget"] = budget
+            if self.tiering:
+                stats["routing"] = self.routing
+            if self.vote_samples > 1:
+                stats["voting"] = self.voting
+
+            for candidate in quant_pass_tickers:
+                ticker = candidate['ticker']
+                result = checkpoint.get("llm", ticker) if checkpoint else None
+                if result is None:
+                    result = evaluated.get(ticker)
+                if result:
+                    print(f"  -> {result['name']}: Total Score {result['total_score']} (Grade {result['grade']})")
+                    all_results.append(result)
+                    if self._is_candidate(result):
+                        candidates.append(result)
+        finally:
+            # Keep whatever was done so far, even on Ctrl-C or a crash
+            if checkpoint:
+                checkpoint.flush()
+            if self.result_store:
+                self.result_store.save()
+                print(f"Incremental screening: {self.result_store.stats()}")
 
                 
         stats["passed_final"] = len(candidates)
         return candidates, all_results, stats
 
-    def _calculate_quant_score(self, per, pbr):
-        score_per = 0
-        if per < 5: score_per = 20
-        elif per < 8: score_per = 15
-        elif per < 10: score_per = 10
-        else: score_per = 5 
-
-        score_pbr = 0
-        if pbr < 0.3: score_pbr = 5
-        elif pbr < 0.6: score_pbr = 4
-        elif pbr < 1.0: score_pbr = 3
-        elif pbr <= 1.0: score_pbr = 3
-        else: score_pbr = 0
+    def screen_quant(self, tickers):
+        """
+        Level 1 for many tickers at once: one market-wide fundamentals request, then the quant
+        filter and score ladders as vectorized masks.
+        Returns: {ticker: (bool, total_quant_score, details_dict)}
+        """
+        self._fundamentals = self.market.get_fundamental_frame(tickers)
+        features = self._fundamentals.reindex(columns=["per", "pbr"])
+        evaluated = self.rules.evaluate(features)
         
-        return score_per, score_pbr
+        outcomes = {}
+        for ticker, row in evaluated.iterrows():
+            if not row["passed"]:
+                outcomes[ticker] = (False, 0, {})
+                continue
+            per = float(features.at[ticker, "per"])
+            pbr = float(features.at[ticker, "pbr"])
+            s_per, s_pbr = int(row["score_per"]), int(row["score_pbr"])
+            outcomes[ticker] = (True, s_per + s_pbr, {"per": per, "pbr": pbr, "score_per": s_per, "score_pbr": s_pbr})
+        return outcomes
+
+    def _grade_threshold(self, grade):
+        return dict(self.GRADE_THRESHOLDS)[grade]
+
+    def _is_candidate(self, result):
+        """True if the result's grade is the target grade or better."""
+        return bool(result) and result['grade'] != 'D' and \
+            self._grade_threshold(result['grade']) >= self._grade_threshold(self.target_grade)
+
+    def _calculate_quant_score(self, per, pbr):
+        scores = self.rules.score(per=per, pbr=pbr)
+        return scores["score_per"], scores["score_pbr"]
 
     def _check_quant_and_score(self, ticker):
         """
@@ -94,7 +258,7 @@ class BluechipScreener:
             pbr = float(fund.get('PBR', 100))
             
             # Simple broad filter
-            if 0 < per < 20 and 0 < pbr < 1.5:
+            if self.rules.check("quant", per=per, pbr=pbr):
                 s_per, s_pbr = self._calculate_quant_score(per, pbr)
                 total = s_per + s_pbr
                 return True, total, {"per": per, "pbr": pbr, "score_per": s_per, "score_pbr": s_pbr}
@@ -104,11 +268,301 @@ class BluechipScreener:
         return False, 0, {}
 
     def evaluate_company(self, ticker, pre_calc_score=None, pre_calc_details=None):
+        context = self._prepare_company(ticker, pre_calc_score, pre_calc_details)
+        if context is None:
+            return None
+        if context["reused"]:
+            return context["reused"]
+        return self._score_single(context)
+
+    def evaluate_companies(self, quant_candidates, on_result=None, scheduler=None, stop_after=None):
+        """
+        Evaluates many companies, scoring up to `batch_size` of them per LLM request.
+        Companies missing or invalid in a batch response fall back to single-company calls.
+        With tiering, the triage model scores every company first and only those within
+        escalation_margin of the target grade (or above it) are re-scored by the final model.
+        Companies whose local scores (see LOCAL_SCORES) leave the target grade out of reach even with
+        the maximum LLM scores are not sent; they are listed in self.pruned_local. The DART data behind
+        those scores is fetched a wave at a time as scoring proceeds (see _score_prepared), so companies
+        the budget or stop_after never reach cost no DART calls.
+        on_result(ticker, result) is called for each successful evaluation as it completes.
+        scheduler: optional BudgetScheduler; companies it does not admit are not evaluated
+        (quant_candidates should come in priority order).
+        stop_after: optional - no new requests are sent once this many candidates are found.
+        Returns: {ticker: result dict or None} of the evaluated companies
+        """
+        scheduler = scheduler or BudgetScheduler()
+        results = {}
+        found = [0]
+        self.routing = {"triaged": 0, "escalated": 0, "final": 0}
+        self.voting = {"voted": 0, "samples": 0, "changed": 0}
+        self.pruned_local = []
+        # Borderline results waiting for their vote (voting mode), and every ticker scored so far
+        borderline = []
+        scored = set()
+        
+        def done(context, result):
+            scored.add(context["ticker"])
+            if result and self.vote_samples > 1 and not context.get("reused") and self._is_borderline(result):
+                borderline.append((context, result))
+                return
+            finish(context, result)
+        
+        def finish(context, result):
+            results[context["ticker"]] = result
+            if self._is_candidate(result):
+                found[0] += 1
+            if result and not context.get("reused") and self.result_store:
+                self.result_store.store("llm", context["ticker"], context["fingerprint"], result)
+            if result and on_result:
+                on_result(context["ticker"], result)
+        
+        def enough():
+            return stop_after is not None and found[0] >= stop_after
+        
+        if not self.tiering:
+            for context, result in self._score_prepared(quant_candidates, scheduler, enough, done):
+                done(context, result)
+        else:
+            self._score_tiered(quant_candidates, scheduler, enough, done, scored)
+        if self.pruned_local:
+            print(f"Pruned {len(self.pruned_local)} companies on their rule-based scores.")
+        
+        # Voting mode: borderline grades are settled by the median of several samples
+        for context, result in self._vote(borderline, scheduler):
+            finish(context, result)
+        
+        return results
+
+    def _score_tiered(self, candidates, scheduler, enough, done, scored):
+        """Model tiering: triage everyone with the cheap model, re-score the finalists with the final model."""
+        # 1. Triage: the cheap model scores everyone; clear misses are final right away
+        escalate_from = self._grade_threshold(self.target_grade) - self.escalation_margin
+        triaged = {}
+        for context, result in self._score_prepared(candidates, scheduler, enough, done, task="triage"):
+            self.routing["triaged"] += 1
+            if result and result["total_score"] >= escalate_from:
+                triaged[context["ticker"]] = (context, result)
+            else:
+                done(context, result)
+        
+        # 2. Finalists (near or above the target grade) are re-scored by the expensive model
+        finalists = [context for context, _ in triaged.values()]
+        self.routing["escalated"] = len(finalists)
+        if finalists:
+            print(f"Escalating {len(finalists)} companies to {self._model('final')} for final scoring.")
+        for context, result in self._score(finalists, scheduler, enough, task="final"):
+            if result:
+                self.routing["final"] += 1
+                done(context, result)
+        
+        # Finalists the final model could not score (error, budget, stop) keep their triage result
+        for ticker, (context, result) in triaged.items():
+            if ticker not in scored:
+                done(context, result)
+
+    def _is_borderline(self, result):
+        """True if the total score is within vote_margin of a grade threshold."""
+        return any(abs(result["total_score"] - threshold) <= self.vote_margin for _, threshold in self.GRADE_THRESHOLDS)
+
+    def _vote(self, borderline, scheduler):
+        """
+        Draws vote_samples - 1 more single-company samples per borderline result, all concurrently,
+        each with its own sampling seed (so they are neither cached nor coalesced together), on the
+        model tier that produced the result. The sample with the median total wins; the totals and
+        their spread are kept under result["vote"].
+        Yields (context, voted result) per borderline company.
+        """
+        if not borderline:
+            return
+        jobs = []
+        for context, result in borderline:
+            prompt = self._single_prompt(context)
+            for seed in range(1, self.vote_samples):
+                # Budget in priority order, like every other request; a refused company asks only once
+                if not scheduler.admit([context["ticker"]], BLUECHIP_SCORING_PREFIX + prompt):
+                    break
+                jobs.append((context, result["tier"], seed, prompt))
+        print(f"Voting on {len(borderline)} borderline companies: {len(jobs)} extra samples.")
+        
+        def sample(job):
+            _, task, seed, prompt = job
+            params = dict(self._single_config(), seed=seed)
+            return self.llm.generate_text(prompt, params=params, task=task, prefix=BLUECHIP_SCORING_PREFIX)
+        
+        with ThreadPoolExecutor(max_workers=max(1, getattr(self.llm, "max_concurrency", 1))) as pool:
+            responses = list(pool.map(sample, jobs))
+        
+        samples = {context["ticker"]: [result] for context, result in borderline}
+        for (context, task, _, prompt), response in zip(jobs, responses):
+            scheduler.charge(response, BLUECHIP_SCORING_PREFIX + prompt)
+            result = self._parse_single(context, response, task)
+            if result:
+                samples[context["ticker"]].append(result)
+        
+        for context, first in borderline:
+            drawn = samples[context["ticker"]]
+            if len(drawn) == 1:
+                # No extra sample (budget, errors): the single result stands
+                yield context, first
+                continue
+            ranked = sorted(drawn, key=lambda r: r["total_score"])
+            totals = [r["total_score"] for r in drawn]
+            voted = dict(ranked[(len(ranked) - 1) // 2], vote={
+                "totals": totals,
+                "grades": [r["grade"] for r in drawn],
+                "spread": max(totals) - min(totals)
+            })
+            self.voting["voted"] += 1
+            self.voting["samples"] += len(drawn) - 1
+            if voted["grade"] != first["grade"]:
+                self.voting["changed"] += 1
+            print(f"  -> {context['name']}: vote totals {totals} -> {voted['total_score']} (Grade {voted['grade']})")
+            yield context, voted
+
+    def _score_prepared(self, candidates, scheduler, stop, done, task=None):
+        """
+        First scoring pass over quant candidates (in priority order): prepares them a wave of requests
+        at a time and scores each wave before preparing the next. Stops preparing once stop() returns
+        True or the pass's budget share is used up (the rest are recorded as skipped by the budget).
+        Companies without data, with a reusable result, or pruned on their local scores go to done()
+        (or self.pruned_local) instead. Yields (context, result or None) per company sent.
+        """
+        # One wave of requests; the whole pass in batch-job mode (a single batch job)
+        wave_size = len(candidates) if self.batch_job else self.batch_size * max(1, getattr(self.llm, "max_concurrency", 1))
+        target_score = self._grade_threshold(self.target_grade)
+        share = self._budget_share(task)
+        queue = list(candidates)
+        while queue and not stop():
+            if scheduler.closed(share):
+                scheduler.skip([c['ticker'] for c in queue])
+                break
+            pending = []
+            # Top up to a full wave, so pruned or reused companies do not leave batches half empty
+            while queue and len(pending) < wave_size:
+                chunk, queue = queue[:wave_size - len(pending)], queue[wave_size - len(pending):]
+                for candidate, context in zip(chunk, self._prepare_companies(chunk)):
+                    if context is None:
+                        done({"ticker": candidate['ticker']}, None)
+                    elif context["reused"]:
+                        done(context, context["reused"])
+                    elif context["score_per"] + context["score_pbr"] + context["local_score"] + self.SCORE_SCHEMA.max_total() < target_score:
+                        print(f"  -> {context['name']}: cannot reach Grade {self.target_grade} with its rule-based scores, not sent to the LLM.")
+                        self.pruned_local.append(context["ticker"])
+                    else:
+                        pending.append(context)
+            yield from self._score(pending, scheduler, stop, task)
+
+    def _score(self, contexts, scheduler, stop=None, task=None):
+        """
+        Scores contexts in batches of `batch_size` (falling back to single-company calls for
+        companies missing in a batch response). A batch request that fails outright (e.g. 429s or an
+        open circuit breaker) fails all of its companies - one single call each would only add load
+        to a saturated provider. Yields (context, result or None) per company sent.
+        """
+        # Batches (and the single-company fallbacks) are sent concurrently through the LLM client
+        batches = [contexts[i:i + self.batch_size] for i in range(0, len(contexts), self.batch_size)]
+        singles = [batch[0] for batch in batches if len(batch) == 1]
+        batches = [batch for batch in batches if len(batch) > 1]
+        
+        retry = []
+        for batch, response in self._send(batches, self._batch_prompt, BLUECHIP_BATCH_SCORING_PREFIX, self._batch_config(),
+                                          scheduler, stop, task):
+            if not response.ok:
+                print(f"Error scoring batch: {response}")
+                for context in batch:
+                    yield context, None
+                continue
+            scored = self._parse_batch(batch, response)
+            for context in batch:
+                data = scored.get(context["ticker"])
+                if data is not None:
+                    yield context, self._build_result(context, data, response.model_id, task)
+                else:
+                    print(f"  -> {context['name']}: missing/invalid in batch response, scoring alone.")
+                    retry.append(context)
+        
+        for context, response in self._send(singles + retry, self._single_prompt, BLUECHIP_SCORING_PREFIX, self._single_config(),
+                                            scheduler, stop, task):
+            yield context, self._parse_single(context, response, task)
+
+    def _budget_share(self, task):
+        """
+        Share of the budget a scoring pass may fill. The first pass (triage, or the only pass without
+        tiering) leaves RESERVED_BUDGET_SHARE for later passes; with voting, the final pass leaves half
+        of it for the votes, which may use the rest.
+        """
+        voting = self.vote_samples > 1
+        if task == "final":
+            return 1 - self.RESERVED_BUDGET_SHARE / 2 if voting else 1.0
+        return 1 - self.RESERVED_BUDGET_SHARE if (self.tiering or voting) else 1.0
+
+    def _model(self, task):
+        model_for = getattr(self.llm, "model_for", None)
+        return model_for(task) if model_for else None
+
+    def _send(self, items, build_prompt, prefix, params, scheduler, stop=None, task=None):
+        """
+        Sends one prompt per item (a batch of contexts, or a single context) concurrently, in waves of
+        the client's concurrency. Each request is admitted against the budget (its pass's share of it)
+        right before its wave, so a time budget stops the work between waves; so does stop() returning True.
+        prefix: static text every prompt follows.
+        In batch-job mode all items form one wave, submitted as a single batch job.
+        Yields (item, response) for the items that were sent, one wave at a time
+        """
+        wave_size = max(1, len(items) if self.batch_job else getattr(self.llm, "max_concurrency", 1))
+        share = self._budget_share(task)
+        for start in range(0, len(items), wave_size):
+            if stop and stop():
+                break
+            wave = []
+            for item in items[start:start + wave_size]:
+                contexts = item if isinstance(item, list) else [item]
+                prompt = build_prompt(item)
+                if not scheduler.admit([c["ticker"] for c in contexts], prefix + prompt, share=share):
+                    continue
+                if len(contexts) > 1:
+                    print(f"Scoring batch of {len(contexts)} companies: {', '.join(c['name'] for c in contexts)}")
+                wave.append((item, prompt))
+            
+            prompts = [prompt for _, prompt in wave]
+            if self.batch_job:
+                responses = self.llm.generate_batch(prompts, params=params, task=task, prefix=prefix) if wave else []
+            else:
+                responses = self.llm.generate_many(prompts, params=params, task=task, prefix=prefix)
+            for (item, prompt), response in zip(wave, responses):
+                scheduler.charge(response, prefix + prompt)
+                yield item, response
+
+    def _prepare_companies(self, candidates):
+        """Contexts of quant candidates (None where there is no data), prepared on max_workers threads."""
+        if self.ownership is None and self._listed_names is None:
+            self._listed_names = self._listed_company_names()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(lambda c: self._prepare_company(c['ticker'], c['quant_score'], c['details']), candidates))
+
+    def _listed_company_names(self):
+        """{company name: ticker} of the listed companies of the run, from one DART corp listing request."""
+        listing = self.dart.get_corp_listing()
+        if listing is None or listing.empty:
+            return {}
+        return {row.corp_name: row.stock_code for row in listing.itertuples()
+                if self._universe is None or row.stock_code in self._universe}
+
+    def _prepare_company(self, ticker, pre_calc_score=None, pre_calc_details=None):
+        """
+        Gathers everything the LLM scoring needs for one company.
+        Returns a context dict (with "reused" set to the previous result if the inputs are unchanged),
+        or None if there is no data.
+        """
         corp_name = self.market.get_stock_name(ticker)
         print(f"Evaluating {corp_name} ({ticker})...")
         
-        # 1. Fetch Data
-        fund = self.market.get_fundamental(ticker)
+        # 1. Fetch Data (already loaded by the quant stage in most cases)
+        if ticker in self._fundamentals.index:
+            fund = self._fundamentals.loc[ticker].rename(str.upper)
+        else:
+            fund = self.market.get_fundamental(ticker)
         if fund is None or fund.empty: return None
         
         per = float(fund.get('PER', 0))
@@ -121,85 +575,184 @@ class BluechipScreener:
              score_per = pre_calc_details['score_per']
              score_pbr = pre_calc_details['score_pbr']
 
-        quant_reasoning = []
-        quant_reasoning.append(f"PER {per} -> {score_per}pts")
-        quant_reasoning.append(f"PBR {pbr} -> {score_pbr}pts")
-        
-        # Get Financial History
-        profit_history_str = "Data Not Available"
-        # In real impl, we should fetch DART listing here.
-        # For MVP, let's trust the LLM's internal knowledge or provide mock data if needed.
-        if self.dart.api_key == "MOCK":
-             profit_history_str = "2020: 100B, 2021: 120B, 2022: 150B, 2023: 130B, 2024: 160B"
+        # Rule-based criteria from DART data: operating income history and listed parents / subsidiaries
+        corp_code = self.dart.find_corp_code(corp_name)
+        if corp_code:
+            profit_history = self.dart.get_operating_income_history(corp_code, tuple(self.PROFIT_YEARS))
+        else:
+            profit_history = {year: None for year in self.PROFIT_YEARS}
+        if self.ownership is not None:
+            parents = {self.ownership.name(t): pct for t, pct in self.ownership.parents_of(ticker).items()}
+            children = {self.ownership.name(t): pct for t, pct in self.ownership.children_of(ticker).items()}
+        else:
+            if self._listed_names is None:
+                self._listed_names = self._listed_company_names()
+            shareholders = shareholder_stakes(self.dart.get_major_shareholders(corp_code)) if corp_code else {}
+            parents, children = listed_shareholders(corp_name, shareholders, self._listed_names), {}
+        local = {
+            "duplicate_listing_score": duplicate_listing(corp_name, parents, children),
+            "profit_sustainability_score": profit_sustainability(profit_history)
+        }
 
-        # 2. LLM Analysis
-        company_data = {
-            "name": corp_name,
+        context = {
             "ticker": ticker,
-            "profit_history": profit_history_str,
+            "name": corp_name,
+            "per": per,
             "pbr": pbr,
-            "per": per
+            "score_per": score_per,
+            "score_pbr": score_pbr,
+            # {criterion: (score, reason)} of the rule-based criteria, and their sum
+            "local": local,
+            "local_score": sum(score for score, _ in local.values()),
+            # 2. LLM Analysis input (subjective criteria only)
+            "company_data": {
+                "name": corp_name,
+                "ticker": ticker,
+                "pbr": pbr,
+                "per": per
+            },
+            "fingerprint": None,
+            "reused": None
         }
         
-        prompt = BLUECHIP_SCORING_PROMPT.format(**company_data)
+        # Reuse the previous evaluation if its inputs are unchanged. Raw PER/PBR move with the
+        # price every day, so only their score bands count; BPS/EPS change with new filings.
+        # The model routing counts too: a changed model or escalation margin re-scores, and so
+        # do new operating income figures or listed parents / subsidiaries (the rule-based scores).
+        if self.result_store:
+            routing = (self._model("triage"), self._model("final"), self.escalation_margin) if self.tiering else self._model(None)
+            if self.vote_samples > 1:
+                routing = (routing, self.vote_samples, self.vote_margin)
+            context["fingerprint"] = fingerprint(
+                BLUECHIP_SCORING_PROMPT, ticker, corp_name, profit_history, parents, children, local,
+                score_per, score_pbr, fund.get('BPS'), fund.get('EPS'), routing
+            )
+            saved = self.result_store.lookup("llm", ticker, context["fingerprint"])
+            if saved is not None:
+                print(f"  -> Inputs unchanged, reusing previous evaluation.")
+                context["reused"] = dict(saved, details=dict(saved["details"], per=per, pbr=pbr))
         
+        return context
+
+    def _score_single(self, context):
+        response = self.llm.generate_text(self._single_prompt(context), params=self._single_config(), prefix=BLUECHIP_SCORING_PREFIX)
+        result = self._parse_single(context, response)
+        if result and self.result_store:
+            self.result_store.store("llm", context["ticker"], context["fingerprint"], result)
+        return result
+
+    def _single_config(self):
+        return json_config(self.SCORE_SCHEMA.response_schema())
+
+    def _batch_config(self):
+        return json_config(self.SCORE_SCHEMA.response_schema(key_field="ticker", array=True))
+
+    def _single_prompt(self, context):
+        return self.single_prompt.build(**context["company_data"])
+
+    def _parse_single(self, context, response, tier=None):
+        """response: LLMResult of a single-company prompt. tier: routing task it was scored with."""
+        if not response.ok:
+            print(f"Error evaluating {context['name']}: {response}")
+            return None
         try:
-            response_json_str = self.llm.generate_text(prompt)
-            # Parse JSON
-            # Cleanup markdown code blocks if present
-            cleaned_json = response_json_str.replace("```json", "").replace("```", "").strip()
-            data = json.loads(cleaned_json)
-            
-            qual_score = data.get("total_qual_score", 0)
-            reasoning = data.get("reasoning", "")
-            
-            # Additional keys
-            s_dup = data.get("duplicate_listing_score", 0)
-            s_brand = data.get("global_brand_score", 0)
-            s_prof = data.get("profit_sustainability_score", 0)
-            s_grow = data.get("growth_potential_score", 0)
-            s_mgmt = data.get("management_score", 0)
-            
-            total_score = score_per + score_pbr + qual_score
-            
-            # Grade
-            # Grade
-            # Max Score Calculation:
-            # PER (20) + PBR (5) = 25
-            # Qual (35) [Dup(5)+Brand(5)+Prof(5)+Grow(10)+Mgmt(10)]
-            # Total Max = 60.
-            # Adjusted Thresholds:
-            # A (90%): 54+
-            # B (80%): 48+
-            # C (50%): 30+
-            
-            if total_score >= 54: grade = 'A'
-            elif total_score >= 48: grade = 'B'
-            elif total_score >= 30: grade = 'C'
-            else: grade = 'D'
-            
-            return {
-                "ticker": ticker,
-                "name": corp_name,
-                "score_per": score_per,
-                "score_pbr": score_pbr,
-                "score_qual": qual_score,
-                "total_score": total_score,
-                "grade": grade,
-                "details": {
-                    "per": per,
-                    "pbr": pbr,
-                    "duplicate_listing": s_dup,
-                    "global_brand": s_brand,
-                    "profit_sustainability": s_prof,
-                    "growth_potential": s_grow,
-                    "management": s_mgmt,
-                    "llm_reasoning": reasoning
-                }
-            }
+            # Tolerant parse: code fences, surrounding text, trailing commas, truncation
+            data = extract_json(response.text)
+            if isinstance(data, list) and data:
+                data = data[0]
+            # Missing scores count as the lowest allowed value rather than losing the whole answer
+            data = self.SCORE_SCHEMA.repair(data, fill_missing=True)
+            if data is None:
+                raise ValueError("response is not a JSON object")
+            return self._build_result(context, data, response.model_id, tier)
 
         except Exception as e:
-            print(f"Error evaluating {corp_name}: {e}")
-            if 'response_json_str' in locals():
-                 print(f"Failed JSON: {response_json_str}")
+            print(f"Error evaluating {context['name']}: {e}")
+            print(f"Failed JSON: {response.text}")
             return None
+
+    def _batch_prompt(self, batch):
+        """Per-request part of a BLUECHIP_BATCH_SCORING_PROMPT for several companies."""
+        companies = "\n".join(self.company_line.render(c["company_data"]) for c in batch)
+        return BLUECHIP_BATCH_COMPANIES.format(companies=companies)
+
+    def _parse_batch(self, batch, response):
+        """
+        response: LLMResult of a successful batch prompt.
+        Returns: {ticker: score dict} for the elements of a batch response that are valid.
+        """
+        try:
+            items = extract_json(response.text)
+        except ValueError as e:
+            print(f"Error parsing batch response: {e}")
+            print(f"Failed JSON: {response.text}")
+            return {}
+        if isinstance(items, dict):
+            items = [items]
+        
+        wanted = {c["ticker"] for c in batch}
+        scored = {}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            ticker = str(item.get("ticker", "")).strip()
+            if ticker.isdigit():
+                ticker = ticker.zfill(6) # Numeric tickers may come back without leading zeros
+            # Items with missing scores are left out and scored alone
+            item = self.SCORE_SCHEMA.repair(item)
+            if ticker in wanted and item is not None:
+                scored[ticker] = item
+        return scored
+
+    def _build_result(self, context, data, model=None, tier=None):
+        score_per = context["score_per"]
+        score_pbr = context["score_pbr"]
+        
+        # Rule-based scores (computed locally), then the LLM's
+        s_dup, dup_reason = context["local"]["duplicate_listing_score"]
+        s_prof, prof_reason = context["local"]["profit_sustainability_score"]
+        s_brand = data.get("global_brand_score", 0)
+        s_grow = data.get("growth_potential_score", 0)
+        s_mgmt = data.get("management_score", 0)
+        
+        # Recomputed from the (repaired) components rather than trusting the model's sum
+        qual_score = s_dup + s_brand + s_prof + s_grow + s_mgmt
+        reasoning = data.get("reasoning", "")
+        
+        total_score = score_per + score_pbr + qual_score
+        
+        # Grade
+        # Max Score Calculation:
+        # PER (20) + PBR (5) = 25
+        # Qual (35) [Dup(5)+Prof(5) rule-based, Brand(5)+Grow(10)+Mgmt(10) by the LLM]
+        # Total Max = 60.
+        # Adjusted Thresholds (GRADE_THRESHOLDS):
+        # A (90%): 54+
+        # B (80%): 48+
+        # C (50%): 30+
+        grade = next((g for g, threshold in self.GRADE_THRESHOLDS if total_score >= threshold), 'D')
+        
+        result = {
+            "ticker": context["ticker"],
+            "name": context["name"],
+            "score_per": score_per,
+            "score_pbr": score_pbr,
+            "score_qual": qual_score,
+            "total_score": total_score,
+            "grade": grade,
+            # LLM that produced the qualitative scores, and its tier ("triage" / "final") when tiering
+            "model": model,
+            "tier": tier,
+            "details": {
+                "per": context["per"],
+                "pbr": context["pbr"],
+                "duplicate_listing": s_dup,
+                "global_brand": s_brand,
+                "profit_sustainability": s_prof,
+                "growth_potential": s_grow,
+                "management": s_mgmt,
+                "llm_reasoning": reasoning,
+                "rule_based": {"duplicate_listing": dup_reason, "profit_sustainability": prof_reason}
+            }
+        }
+        return result